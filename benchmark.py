@@ -0,0 +1,459 @@
+"""
+PDF Converter benchmark - measure throughput and latency of the conversion engine
+Author: Leo Lynn (https://github.com/leolynn7)
+
+Generates a corpus of .docx/.xlsx/.pptx/.odt files and runs it through
+pdf_converter.convert(). By default LibreOffice is replaced by a fake
+soffice script with configurable startup and render delays, so scheduler
+changes can be compared deterministically on machines without LibreOffice.
+Pass --real (or --soffice PATH) to benchmark an actual installation.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+import pdf_converter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+FAKE_SOFFICE = '''#!{python}
+# Fake soffice generated by benchmark.py: sleeps instead of rendering
+import os, sys, time
+
+STARTUP = {startup!r}
+PER_FILE = {per_file!r}
+RATE = {rate!r}
+
+args = sys.argv[1:]
+if '--version' in args:
+    print('LibreOffice 0.0.0.0 (fake soffice for benchmarks)')
+    sys.exit(0)
+
+time.sleep(STARTUP)
+outdir = os.getcwd()
+inputs = []
+it = iter(args)
+for arg in it:
+    if arg == '--outdir':
+        outdir = next(it)
+    elif arg == '--convert-to':
+        next(it)
+    elif not arg.startswith('-'):
+        inputs.append(arg)
+
+for path in inputs:
+    time.sleep(PER_FILE + os.path.getsize(path) / RATE)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    text = ('BT /F1 12 Tf 72 720 Td (' + stem.replace('(', '').replace(')', '') + ') Tj ET').encode()
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length ' + str(len(text)).encode() + b' >>\\nstream\\n' + text + b'\\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    data = bytearray(b'%PDF-1.4\\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += str(number).encode() + b' 0 obj\\n' + body + b'\\nendobj\\n'
+    xref = len(data)
+    data += b'xref\\n0 ' + str(len(objects) + 1).encode() + b'\\n0000000000 65535 f \\n'
+    for offset in offsets:
+        data += b'%010d 00000 n \\n' % offset
+    data += (b'trailer\\n<< /Size ' + str(len(objects) + 1).encode() + b' /Root 1 0 R >>\\n'
+             b'startxref\\n' + str(xref).encode() + b'\\n%%EOF\\n')
+    with open(os.path.join(outdir, stem + '.pdf'), 'wb') as f:
+        f.write(data)
+    print('convert ' + path + ' -> ' + os.path.join(outdir, stem + '.pdf'))
+'''
+
+# Minimal package parts for each generated document type
+OOXML_RELS = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+              '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+              '<Relationship Id="rId1" Target="{target}" Type="http://schemas.openxmlformats.org/'
+              'officeDocument/2006/relationships/officeDocument"/></Relationships>')
+
+OOXML_TYPES = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+               '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+               '<Default Extension="xml" ContentType="application/xml"/>{overrides}</Types>')
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua quarterly revenue forecast budget "
+         "table figure summary appendix report meeting agenda action owner status").split()
+
+
+def paragraphs(rng, size):
+    """Random text split into paragraphs totalling roughly size bytes"""
+    result = []
+    total = 0
+    while total < size:
+        text = " ".join(rng.choice(WORDS) for _ in range(60))
+        result.append(text)
+        total += len(text)
+    return result
+
+
+def override(part, content_type):
+    """A [Content_Types].xml override entry"""
+    return f'<Override PartName="{part}" ContentType="{content_type}"/>'
+
+
+def write_docx(path, texts):
+    """Write a minimal WordprocessingML document"""
+    body = "".join(f"<w:p><w:r><w:t>{t}</w:t></w:r></w:p>" for t in texts)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as z:
+        z.writestr('[Content_Types].xml', OOXML_TYPES.format(overrides=override(
+            '/word/document.xml',
+            'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml')))
+        z.writestr('_rels/.rels', OOXML_RELS.format(target='word/document.xml'))
+        z.writestr('word/document.xml',
+                   '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                   f'<w:body>{body}</w:body></w:document>')
+
+
+def write_xlsx(path, texts):
+    """Write a minimal SpreadsheetML workbook with one cell per paragraph"""
+    rows = "".join(f'<row r="{i}"><c r="A{i}" t="inlineStr"><is><t>{t}</t></is></c></row>'
+                   for i, t in enumerate(texts, 1))
+    main = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    rel = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as z:
+        z.writestr('[Content_Types].xml', OOXML_TYPES.format(overrides=(
+            override('/xl/workbook.xml',
+                     'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml')
+            + override('/xl/worksheets/sheet1.xml',
+                       'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'))))
+        z.writestr('_rels/.rels', OOXML_RELS.format(target='xl/workbook.xml'))
+        z.writestr('xl/workbook.xml',
+                   f'<workbook xmlns="{main}" xmlns:r="{rel}"><sheets>'
+                   '<sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        z.writestr('xl/_rels/workbook.xml.rels',
+                   '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   f'<Relationship Id="rId1" Type="{rel}/worksheet" Target="worksheets/sheet1.xml"/>'
+                   '</Relationships>')
+        z.writestr('xl/worksheets/sheet1.xml',
+                   f'<worksheet xmlns="{main}"><sheetData>{rows}</sheetData></worksheet>')
+
+
+def write_pptx(path, texts):
+    """Write a minimal PresentationML deck with one slide per few paragraphs"""
+    p = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+    a = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+    rel = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    pkg = 'http://schemas.openxmlformats.org/package/2006/relationships'
+    ct = 'application/vnd.openxmlformats-officedocument.presentationml.'
+    slides = [texts[i:i + 5] for i in range(0, len(texts), 5)]
+    empty_tree = ('<p:cSld><p:spTree><p:nvGrpSpPr><p:cNvPr id="1" name=""/><p:cNvGrpSpPr/><p:nvPr/>'
+                  '</p:nvGrpSpPr><p:grpSpPr/>{shapes}</p:spTree></p:cSld>')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as z:
+        z.writestr('[Content_Types].xml', OOXML_TYPES.format(overrides=(
+            override('/ppt/presentation.xml', ct + 'presentation.main+xml')
+            + override('/ppt/slideMasters/slideMaster1.xml', ct + 'slideMaster+xml')
+            + override('/ppt/slideLayouts/slideLayout1.xml', ct + 'slideLayout+xml')
+            + "".join(override(f'/ppt/slides/slide{i}.xml', ct + 'slide+xml')
+                      for i in range(1, len(slides) + 1)))))
+        z.writestr('_rels/.rels', OOXML_RELS.format(target='ppt/presentation.xml'))
+        slide_ids = "".join(f'<p:sldId id="{255 + i}" r:id="rId{i + 1}"/>'
+                            for i in range(1, len(slides) + 1))
+        z.writestr('ppt/presentation.xml',
+                   f'<p:presentation xmlns:p="{p}" xmlns:r="{rel}">'
+                   '<p:sldMasterIdLst><p:sldMasterId id="2147483648" r:id="rId1"/></p:sldMasterIdLst>'
+                   f'<p:sldIdLst>{slide_ids}</p:sldIdLst>'
+                   '<p:sldSz cx="9144000" cy="6858000"/><p:notesSz cx="6858000" cy="9144000"/>'
+                   '</p:presentation>')
+        z.writestr('ppt/_rels/presentation.xml.rels',
+                   f'<Relationships xmlns="{pkg}">'
+                   f'<Relationship Id="rId1" Type="{rel}/slideMaster" Target="slideMasters/slideMaster1.xml"/>'
+                   + "".join(f'<Relationship Id="rId{i + 1}" Type="{rel}/slide" Target="slides/slide{i}.xml"/>'
+                             for i in range(1, len(slides) + 1))
+                   + '</Relationships>')
+        z.writestr('ppt/slideMasters/slideMaster1.xml',
+                   f'<p:sldMaster xmlns:p="{p}" xmlns:a="{a}" xmlns:r="{rel}">'
+                   + empty_tree.format(shapes='')
+                   + '<p:sldLayoutIdLst><p:sldLayoutId id="2147483649" r:id="rId1"/></p:sldLayoutIdLst>'
+                   '</p:sldMaster>')
+        z.writestr('ppt/slideMasters/_rels/slideMaster1.xml.rels',
+                   f'<Relationships xmlns="{pkg}"><Relationship Id="rId1" Type="{rel}/slideLayout" '
+                   'Target="../slideLayouts/slideLayout1.xml"/></Relationships>')
+        z.writestr('ppt/slideLayouts/slideLayout1.xml',
+                   f'<p:sldLayout xmlns:p="{p}" xmlns:a="{a}" xmlns:r="{rel}">'
+                   + empty_tree.format(shapes='') + '</p:sldLayout>')
+        z.writestr('ppt/slideLayouts/_rels/slideLayout1.xml.rels',
+                   f'<Relationships xmlns="{pkg}"><Relationship Id="rId1" Type="{rel}/slideMaster" '
+                   'Target="../slideMasters/slideMaster1.xml"/></Relationships>')
+        for i, chunk in enumerate(slides, 1):
+            runs = "".join(f'<a:p><a:r><a:t>{t}</a:t></a:r></a:p>' for t in chunk)
+            shape = ('<p:sp><p:nvSpPr><p:cNvPr id="2" name="Text"/><p:cNvSpPr txBox="1"/><p:nvPr/></p:nvSpPr>'
+                     '<p:spPr><a:xfrm><a:off x="457200" y="457200"/><a:ext cx="8229600" cy="5943600"/>'
+                     f'</a:xfrm></p:spPr><p:txBody><a:bodyPr/>{runs}</p:txBody></p:sp>')
+            z.writestr(f'ppt/slides/slide{i}.xml',
+                       f'<p:sld xmlns:p="{p}" xmlns:a="{a}" xmlns:r="{rel}">'
+                       + empty_tree.format(shapes=shape) + '</p:sld>')
+            z.writestr(f'ppt/slides/_rels/slide{i}.xml.rels',
+                       f'<Relationships xmlns="{pkg}"><Relationship Id="rId1" Type="{rel}/slideLayout" '
+                       'Target="../slideLayouts/slideLayout1.xml"/></Relationships>')
+
+
+def write_odt(path, texts):
+    """Write a minimal OpenDocument text file"""
+    body = "".join(f"<text:p>{t}</text:p>" for t in texts)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as z:
+        # The mimetype entry must come first and be stored uncompressed
+        z.writestr('mimetype', 'application/vnd.oasis.opendocument.text')
+        z.writestr('META-INF/manifest.xml',
+                   '<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" '
+                   'manifest:version="1.2">'
+                   '<manifest:file-entry manifest:full-path="/" '
+                   'manifest:media-type="application/vnd.oasis.opendocument.text"/>'
+                   '<manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>'
+                   '</manifest:manifest>')
+        z.writestr('content.xml',
+                   '<office:document-content '
+                   'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+                   'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" office:version="1.2">'
+                   f'<office:body><office:text>{body}</office:text></office:body>'
+                   '</office:document-content>')
+
+
+WRITERS = {'docx': write_docx, 'xlsx': write_xlsx, 'pptx': write_pptx, 'odt': write_odt}
+
+
+def parse_size(text):
+    """Parse sizes like 20k, 1.5m or 4096 into bytes"""
+    text = text.strip().lower()
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def generate_corpus(folder, count, sizes, types, seed=1):
+    """Write count documents cycling through types and sizes; return their paths"""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        kind = types[i % len(types)]
+        size = sizes[(i // len(types)) % len(sizes)]
+        path = os.path.join(folder, f"doc{i:05d}_{size}.{kind}")
+        WRITERS[kind](path, paragraphs(rng, size))
+        paths.append(path)
+    return paths
+
+
+def write_fake_soffice(folder, startup, per_file, rate):
+    """Create an executable fake soffice and return its path"""
+    path = os.path.join(folder, 'soffice')
+    with open(path, 'w') as f:
+        f.write(FAKE_SOFFICE.format(python=sys.executable, startup=startup,
+                                    per_file=per_file, rate=rate))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of its largest child, in MB"""
+    if resource is None:
+        return None, None
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(children, 1)
+
+
+def measure_startup(folder, binary, use_uno=True):
+    """Time soffice from spawn to ready, then a tiny document twice
+
+    A UNO worker is ready once its bridge answers, after which documents
+    skip startup altogether. Without UNO every --convert-to run starts
+    soffice again, so readiness is timed as a --terminate_after_init run,
+    which starts LibreOffice and exits without loading a document. Either
+    way the profile is initialised beforehand so that one-off cost isn't
+    counted as startup.
+    """
+    path = os.path.join(folder, 'startup_probe.odt')
+    write_odt(path, ['startup probe'])
+    output_dir = tempfile.mkdtemp(prefix="pdfconv-bench-out-")
+    worker = pdf_converter.SofficeWorker(binary, 0, use_uno=use_uno)
+    timings = []
+    try:
+        worker.prewarm()
+        worker.stop()
+        begin = time.perf_counter()
+        if worker.warm:
+            worker.start()
+        else:
+            subprocess.run(worker.base_command() + ['--terminate_after_init'], stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, timeout=pdf_converter.WORKER_START_TIMEOUT)
+        ready = time.perf_counter() - begin
+        for _ in range(2):
+            begin = time.perf_counter()
+            worker.convert(path, pdf_converter.output_path(path, output_dir))
+            timings.append(time.perf_counter() - begin)
+    finally:
+        worker.close()
+        shutil.rmtree(output_dir, ignore_errors=True)
+    first, second = timings
+    return {'spawn_ready_s': round(ready, 3), 'first_pdf_s': round(first, 3),
+            'second_pdf_s': round(second, 3), 'warm': worker.warm}
+
+
+def run_benchmark(paths, binary, jobs, use_uno=True, order='fifo', model=None,
+                  batch_size=pdf_converter.BATCH_SIZE):
+    """Convert a corpus once and return throughput and latency figures"""
+    output_dir = tempfile.mkdtemp(prefix="pdfconv-bench-out-")
+    lock = threading.Lock()
+    started = {}
+    latencies = []
+
+    def on_update(job):
+        now = time.perf_counter()
+        with lock:
+            if job.state == 'running':
+                started[job.index] = now
+            elif job.index in started:
+                latencies.append(now - started[job.index])
+
+    pool = pdf_converter.WorkerPool(binary, size=jobs, use_uno=use_uno)
+    begin = time.perf_counter()
+    try:
+        results = pdf_converter.convert(paths, output_dir, pool=pool, on_update=on_update,
+                                        model=model, largest_first=order == 'largest',
+                                        batch_size=batch_size)
+    finally:
+        pool.shutdown()
+        shutil.rmtree(output_dir, ignore_errors=True)
+    wall = time.perf_counter() - begin
+
+    p50 = percentile(latencies, 50)
+    rss_self, rss_child = peak_rss_mb()
+    return {
+        'jobs': jobs,
+        'order': order,
+        'batch': batch_size,
+        'files': len(results),
+        'failed': sum(1 for job in results if job.state != 'done'),
+        'wall_s': round(wall, 3),
+        'files_per_s': round(len(results) / wall, 2) if wall else 0.0,
+        'p50_s': round(p50, 3),
+        'p95_s': round(percentile(latencies, 95), 3),
+        'p99_s': round(percentile(latencies, 99), 3),
+        'peak_rss_mb': rss_self,
+        'peak_child_rss_mb': rss_child,
+    }
+
+
+def print_table(rows):
+    """Print benchmark results as an aligned table"""
+    columns = ['jobs', 'order', 'batch', 'files', 'failed', 'wall_s', 'files_per_s', 'p50_s', 'p95_s', 'p99_s',
+               'peak_rss_mb', 'peak_child_rss_mb']
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[c]).rjust(w) for c, w in zip(columns, widths)))
+
+
+def main(argv=None):
+    """Parse arguments, build the corpus and run each configuration"""
+    parser = argparse.ArgumentParser(description="Benchmark the PDF Converter engine")
+    parser.add_argument('--files', type=int, default=40, help="documents in the corpus (default: 40)")
+    parser.add_argument('--sizes', default='20k,200k,2m',
+                        help="comma-separated document sizes (default: 20k,200k,2m)")
+    parser.add_argument('--types', default='docx,xlsx,pptx,odt',
+                        help="comma-separated document types (default: docx,xlsx,pptx,odt)")
+    parser.add_argument('--jobs', default=str(pdf_converter.default_jobs()),
+                        help="comma-separated worker counts to compare (default: CPU count)")
+    parser.add_argument('--order', default='fifo',
+                        help="comma-separated queue orders to compare: fifo, largest (default: fifo)")
+    parser.add_argument('--batch', default=str(pdf_converter.BATCH_SIZE),
+                        help="comma-separated soffice batch sizes to compare when there is no UNO "
+                             f"bridge, e.g. 1,{pdf_converter.BATCH_SIZE} (default: {pdf_converter.BATCH_SIZE})")
+    parser.add_argument('--seed', type=int, default=1, help="corpus random seed")
+    parser.add_argument('--real', action='store_true', help="use the installed LibreOffice")
+    parser.add_argument('--soffice', help="path to a LibreOffice executable (implies --real)")
+    parser.add_argument('--fake-startup', type=float, default=1.0,
+                        help="fake soffice startup delay in seconds (default: 1.0)")
+    parser.add_argument('--fake-per-file', type=float, default=0.05,
+                        help="fake per-document render delay in seconds (default: 0.05)")
+    parser.add_argument('--fake-rate', type=float, default=4.0,
+                        help="fake render throughput in MB/s (default: 4.0)")
+    parser.add_argument('--json', action='store_true', help="print results as JSON lines")
+    parser.add_argument('--keep', action='store_true', help="keep the generated corpus")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    types = [t.strip().lstrip('.') for t in args.types.split(',')]
+    unknown = [t for t in types if t not in WRITERS]
+    if unknown:
+        parser.error(f"unsupported types: {', '.join(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix="pdfconv-bench-")
+    try:
+        paths = generate_corpus(workdir, args.files, sizes, types, args.seed)
+        if args.real or args.soffice:
+            binary = args.soffice or pdf_converter.find_soffice()
+            if binary is None:
+                parser.error("LibreOffice not found; pass --soffice PATH")
+            use_uno = True
+        else:
+            # The fake speaks the command line only, not UNO
+            binary = write_fake_soffice(workdir, args.fake_startup, args.fake_per_file,
+                                        args.fake_rate * 1024 ** 2)
+            use_uno = False
+
+        startup = measure_startup(workdir, binary, use_uno)
+        if args.json:
+            print(json.dumps(startup), flush=True)
+        else:
+            paid = "once per worker" if startup['warm'] else "on every soffice run"
+            print(f"startup: soffice ready in {startup['spawn_ready_s']}s ({paid}), "
+                  f"first PDF {startup['first_pdf_s']}s, second PDF {startup['second_pdf_s']}s")
+
+        rows = []
+        for jobs in (int(j) for j in args.jobs.split(',')):
+            for order in args.order.split(','):
+                for batch_size in (int(b) for b in args.batch.split(',')):
+                    # A fresh model for each configuration, so estimates learned in
+                    # one run don't favour the ones after it
+                    model = pdf_converter.ThroughputModel(os.path.join(workdir, f'throughput-{len(rows)}.json'))
+                    row = run_benchmark(paths, binary, jobs, use_uno, order.strip(), model, batch_size)
+                    rows.append(row)
+                    if args.json:
+                        print(json.dumps(row), flush=True)
+        if not args.json:
+            print_table(rows)
+    finally:
+        if args.keep:
+            print(f"corpus kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,13 +4,3350 @@ Author: Leo Lynn (https://github.com/leolynn7)
 Version: 1.3
 """
 
-import tkinter as tk
-from tkinter import filedialog, messagebox
+import argparse
+import collections
+import csv
+import errno
+import filecmp
+import functools
+import glob
+import hashlib
+import heapq
+import itertools
+import json
+import mmap
 import os
+import re
+import select
+import shutil
+import signal
+import struct
 import subprocess
+import sys
+import tempfile
 import threading
+import time
+import urllib.parse
 from pathlib import Path
-import webbrowser
+
+# tkinter is imported by run_gui() so the engine and CLI work without a display
+tk = messagebox = None
+
+
+# Document types offered in the file picker and picked up from folders
+OFFICE_EXTENSIONS = ('.docx', '.doc', '.xlsx', '.xls', '.odt', '.ods', '.ppt', '.pptx')
+
+# How long a worker may take to come up and accept UNO connections
+WORKER_START_TIMEOUT = 30
+
+# Per-document time budgets: a multiple of the predicted conversion time,
+# clamped so hung small files are caught quickly and huge ones get room
+TIMEOUT_FACTOR = 4
+MIN_TIMEOUT = 20
+MAX_TIMEOUT = 1800
+
+# Times a timed-out or crashed document is retried before it counts as failed
+MAX_RETRIES = 1
+
+# Where LibreOffice lives when it isn't on PATH, checked in this order
+SOFFICE_LOCATIONS = (
+    '/opt/libreoffice*/program/soffice',
+    '/usr/lib/libreoffice/program/soffice',
+    '/usr/lib64/libreoffice/program/soffice',
+    '/usr/local/lib/libreoffice/program/soffice',
+    '/snap/bin/libreoffice',
+    '/var/lib/flatpak/exports/bin/org.libreoffice.LibreOffice',
+    '~/.local/share/flatpak/exports/bin/org.libreoffice.LibreOffice',
+    '/Applications/LibreOffice.app/Contents/MacOS/soffice',
+    'C:/Program Files/LibreOffice/program/soffice.exe',
+)
+
+# Seconds a cancelled soffice gets to exit on SIGTERM before it is killed
+CANCEL_GRACE = 3
+
+# Seconds between batched writes to the batch journal
+JOURNAL_INTERVAL = 0.5
+
+# Free space /dev/shm needs before it is used as scratch space for PDFs
+SCRATCH_MIN_FREE = 512 * 1024 ** 2
+
+# Documents of one type handed to a single soffice --convert-to run when
+# there is no UNO bridge, so LibreOffice's startup is paid once per chunk
+BATCH_SIZE = 8
+
+# Default upper bound for the converted-PDF cache
+DEFAULT_CACHE_BYTES = 2 * 1024 ** 3
+
+# Export settings that affect the produced PDF; part of every cache key
+CONVERSION_OPTIONS = 'pdf'
+
+# Post-processing presets for --optimize: (tool, arguments) steps run in
+# order over each finished PDF. Ghostscript downsamples images (150 dpi
+# for ebook, 72 dpi for screen) and writes every duplicated image and
+# font once; qpdf recompresses streams and, for all but lossless,
+# linearizes for fast web view. Both keep classic cross-reference tables
+# so optimized PDFs can still be merged.
+GS_PDFWRITE = ('-q', '-dSAFER', '-sDEVICE=pdfwrite', '-dDetectDuplicateImages=true',
+               '-dCompressFonts=true', '-dWriteObjStms=false', '-dWriteXRefStm=false')
+QPDF_RECOMPRESS = ('--recompress-flate', '--compression-level=9', '--object-streams=disable')
+OPTIMIZE_PRESETS = {
+    'lossless': (('qpdf', QPDF_RECOMPRESS + ('{input}', '{output}')),),
+    'web': (('qpdf', QPDF_RECOMPRESS + ('--linearize', '{input}', '{output}')),),
+    'ebook': (('gs', GS_PDFWRITE + ('-dPDFSETTINGS=/ebook', '-o', '{output}', '{input}')),
+              ('qpdf', QPDF_RECOMPRESS + ('--linearize', '{input}', '{output}'))),
+    'screen': (('gs', GS_PDFWRITE + ('-dPDFSETTINGS=/screen', '-o', '{output}', '{input}')),
+               ('qpdf', QPDF_RECOMPRESS + ('--linearize', '{input}', '{output}'))),
+}
+
+# Executable names tried for each optimization tool
+OPTIMIZE_TOOLS = {'gs': ('gs', 'gswin64c', 'gswin32c'), 'qpdf': ('qpdf',)}
+
+
+class ConversionError(Exception):
+    """Raised when LibreOffice fails to convert a document"""
+
+    def __init__(self, message, returncode=None, stderr=""):
+        super().__init__(message)
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+class ConversionTimeout(ConversionError):
+    """Raised when a conversion runs past its time budget"""
+
+
+class ConversionCrash(ConversionError):
+    """Raised when soffice dies while converting a document"""
+
+
+class ConversionCancelled(ConversionError):
+    """Raised for a conversion stopped by BatchScheduler.cancel()"""
+
+
+def user_cache_dir():
+    """Per-user folder for the PDF cache and other persisted state"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pdf-converter')
+
+
+def search_soffice():
+    """Look for LibreOffice on PATH, then in the usual install locations"""
+    for name in ('libreoffice', 'soffice'):
+        found = shutil.which(name)
+        if found:
+            return found
+    for pattern in SOFFICE_LOCATIONS:
+        # Newest first when several versions are installed under /opt
+        matches = sorted(glob.glob(os.path.expanduser(pattern)), reverse=True,
+                         key=lambda match: [int(n) for n in re.findall(r'\d+', match)])
+        for match in matches:
+            if os.path.isfile(match) and os.access(match, os.X_OK):
+                return match
+    return None
+
+
+class SofficeProbe:
+    """What a previous run learned about the LibreOffice install
+
+    Stored as a small JSON file so that later launches skip the search
+    and the slow ``soffice --version`` call. Entries are trusted only
+    while PATH and the executable's modification time are unchanged.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(user_cache_dir(), 'soffice.json')
+        try:
+            with open(self.path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+        if not isinstance(self.data, dict):
+            self.data = {}
+
+    @staticmethod
+    def mtime(binary):
+        try:
+            return os.stat(binary).st_mtime_ns
+        except OSError:
+            return None
+
+    def binary(self):
+        """The remembered executable, if it is still there and unchanged"""
+        found = self.data.get('binary')
+        if (found and self.data.get('search_path') == os.environ.get('PATH', '')
+                and self.data.get('mtime_ns') == self.mtime(found)):
+            return found
+        return None
+
+    def version(self, binary):
+        """The remembered version of an executable, if it is unchanged"""
+        entry = self.data.get('versions', {}).get(binary)
+        if entry and entry[0] == self.mtime(binary):
+            return entry[1]
+        return None
+
+    def remember_binary(self, binary):
+        """Record the executable found by search_soffice()"""
+        self.data.update(binary=binary, search_path=os.environ.get('PATH', ''),
+                         mtime_ns=self.mtime(binary))
+        self.save()
+
+    def remember_version(self, binary, version):
+        """Record an executable's version"""
+        self.data.setdefault('versions', {})[binary] = [self.mtime(binary), version]
+        self.save()
+
+    def save(self):
+        """Write the probe file atomically; failing to is harmless"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+
+def find_soffice():
+    """Return the LibreOffice executable, or None
+
+    The search runs once and its result is reused by later launches (see
+    SofficeProbe), so startup doesn't pay for it.
+    """
+    probe = SofficeProbe()
+    binary = probe.binary()
+    if binary is None:
+        binary = search_soffice()
+        if binary is not None:
+            probe.remember_binary(binary)
+    return binary
+
+
+@functools.lru_cache(maxsize=None)
+def libreoffice_version(binary):
+    """Return the version string reported by soffice --version"""
+    probe = SofficeProbe()
+    version = probe.version(binary)
+    if version is not None:
+        return version
+    try:
+        result = subprocess.run([binary, '--version'], capture_output=True, text=True, timeout=60)
+        version = result.stdout.strip() or 'unknown'
+    except (OSError, subprocess.TimeoutExpired):
+        return 'unknown'
+    if version != 'unknown':
+        probe.remember_version(binary, version)
+    return version
+
+
+def output_path(path, output_dir):
+    """Where LibreOffice writes the PDF for a source document"""
+    return os.path.join(output_dir, Path(path).stem + '.pdf')
+
+
+def stop_process(process, grace=0):
+    """Stop a process started with start_new_session, and everything it spawned
+
+    soffice is a launcher that runs soffice.bin as a child, so signalling
+    only the launcher would leave the real office process behind. With a
+    ``grace`` period the group gets SIGTERM first, letting LibreOffice drop
+    its profile lock, and SIGKILL only if it is still running afterwards.
+    """
+    stop_processes([process], grace)
+
+
+def stop_processes(processes, grace=0):
+    """stop_process for several processes at once
+
+    Every group is signalled before any is waited for, so the grace period
+    is spent once in total rather than once per process.
+    """
+    def signal_group(process, name):
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(process.pid, getattr(signal, name))
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    if grace:
+        for process in processes:
+            signal_group(process, 'SIGTERM')
+        deadline = time.monotonic() + grace
+        for process in processes:
+            try:
+                process.wait(timeout=max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                pass
+    for process in processes:
+        # Also catches children that outlived the launcher
+        signal_group(process, 'SIGKILL')
+    for process in processes:
+        process.wait()
+
+
+def scratch_root():
+    """RAM-backed folder for work in progress, or the temp folder without one"""
+    try:
+        stat = os.statvfs('/dev/shm')
+        if os.access('/dev/shm', os.W_OK) and stat.f_bavail * stat.f_frsize >= SCRATCH_MIN_FREE:
+            return '/dev/shm'
+    except OSError:
+        pass
+    return tempfile.gettempdir()
+
+
+def copy_fd(src, dst):
+    """Copy a whole file between descriptors inside the kernel where possible
+
+    A method that stops early (returns 0 before the end) hands over to the
+    next one, which continues from the current offsets; a copy that still
+    comes up short raises OSError rather than leave a truncated file.
+    """
+    size = os.fstat(src).st_size
+    copied = 0
+    for method in ('copy_file_range', 'sendfile'):
+        if not hasattr(os, method):
+            continue
+        try:
+            while copied < size:
+                if method == 'copy_file_range':
+                    n = os.copy_file_range(src, dst, size - copied)
+                else:
+                    n = os.sendfile(dst, src, None, size - copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError as e:
+            # Not supported between these filesystems; try the next method
+            if copied or e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+        if copied >= size:
+            break
+    else:
+        with os.fdopen(os.dup(src), 'rb') as fsrc, os.fdopen(os.dup(dst), 'wb') as fdst:
+            shutil.copyfileobj(fsrc, fdst)
+    written = os.fstat(dst).st_size
+    if written != size:
+        raise OSError(errno.EIO, f"Copied {written} of {size} bytes")
+
+
+def publish_file(source, dest, move=True):
+    """Move (or copy) a finished file into place so readers never see it half-written
+
+    On the same filesystem a move is a single rename. Otherwise (tmpfs
+    scratch to a disk or network share) the file is copied next to
+    ``dest`` under a hidden temporary name and then renamed over it.
+    """
+    if move:
+        try:
+            os.replace(source, dest)
+            return dest
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    folder, name = os.path.split(dest)
+    tmp = os.path.join(folder, f".{name}.{os.getpid()}.{threading.get_ident()}.part")
+    try:
+        with open(source, 'rb') as src, open(tmp, 'wb') as dst:
+            copy_fd(src.fileno(), dst.fileno())
+        os.replace(tmp, dest)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    if move:
+        os.remove(source)
+    return dest
+
+
+def pdf_complete(path):
+    """True if a PDF ends with an end-of-file marker, i.e. wasn't cut short"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(max(0, os.path.getsize(path) - 1024))
+            return b'%%EOF' in f.read()
+    except OSError:
+        return False
+
+
+def mark(job, field):
+    """Stamp a job timestamp field with the current time, if tracing a job"""
+    if job is not None:
+        setattr(job, field, time.time())
+
+
+def load_uno():
+    """Import the LibreOffice UNO bridge if this Python has it"""
+    try:
+        import uno
+    except ImportError:
+        return None
+    return uno
+
+
+class SofficeWorker:
+    """A long-lived headless LibreOffice instance with its own profile
+
+    When the UNO bridge is importable the worker keeps one soffice process
+    running and sends it documents over a named pipe, so only the first
+    conversion pays the office startup cost. Without UNO it falls back to
+    one ``--convert-to`` process per file, still reusing its private
+    (already initialised) profile directory.
+    """
+
+    def __init__(self, binary, worker_id, timeout=60, use_uno=True):
+        self.binary = binary
+        self.worker_id = worker_id
+        self.timeout = timeout
+        self.profile_dir = tempfile.mkdtemp(prefix=f"pdfconv-w{worker_id}-")
+        # PDFs are rendered here and only published once complete
+        self.scratch_dir = tempfile.mkdtemp(prefix=f"pdfconv-w{worker_id}-out-", dir=scratch_root())
+        self.pipe_name = f"pdfconv_{os.getpid()}_{worker_id}"
+        self.uno = load_uno() if use_uno else None
+        self.process = None
+        self.desktop = None
+        self.timed_out = False
+        self.converted = 0
+        # soffice working on the current document, and whether it was cancelled
+        self.active = None
+        self.interrupted = False
+
+    @property
+    def warm(self):
+        """True if this worker talks to a persistent soffice over UNO"""
+        return self.uno is not None
+
+    def base_command(self):
+        """soffice arguments shared by warm and cold invocations"""
+        return [self.binary,
+                f"-env:UserInstallation={Path(self.profile_dir).as_uri()}",
+                '--headless', '--invisible', '--nologo',
+                '--norestore', '--nodefault', '--nolockcheck']
+
+    def healthy(self):
+        """Check that the persistent soffice process is still usable"""
+        if not self.warm:
+            return True
+        return self.process is not None and self.process.poll() is None and self.desktop is not None
+
+    def status(self):
+        """Short description of the worker's soffice for health reports"""
+        if not self.warm:
+            return 'per-file'
+        if self.process is None:
+            return 'stopped'
+        if self.process.poll() is not None:
+            return 'crashed'
+        return 'ready' if self.desktop is not None else 'starting'
+
+    def start(self):
+        """Launch soffice and connect to it over a UNO pipe"""
+        if not self.warm:
+            return
+        cmd = self.base_command() + [f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext"]
+        self.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                        start_new_session=True)
+        self.desktop = self.connect()
+
+    def prewarm(self):
+        """Get soffice ready before the first document arrives
+
+        A warm worker starts its persistent soffice. A cold one runs soffice
+        once to initialise its profile, which also pulls LibreOffice into
+        the OS file cache.
+        """
+        if self.warm:
+            if not self.healthy():
+                self.start()
+            return
+        if os.listdir(self.profile_dir):
+            return
+        try:
+            subprocess.run(self.base_command() + ['--terminate_after_init'], stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, timeout=WORKER_START_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+    def connect(self):
+        """Wait for soffice to accept connections and return its Desktop"""
+        local = self.uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local)
+        url = f"uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext"
+        deadline = time.monotonic() + WORKER_START_TIMEOUT
+        while True:
+            if self.process.poll() is not None:
+                raise ConversionError(f"LibreOffice worker {self.worker_id} exited during startup",
+                                      returncode=self.process.returncode)
+            try:
+                ctx = resolver.resolve(url)
+                return ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+            except Exception:
+                if time.monotonic() > deadline:
+                    self.kill()
+                    raise ConversionTimeout(f"LibreOffice worker {self.worker_id} did not start")
+                time.sleep(0.1)
+
+    def kill(self):
+        """Forcefully stop the soffice process"""
+        self.desktop = None
+        if self.process is not None:
+            stop_process(self.process)
+
+    def interrupt(self):
+        """Mark the worker interrupted and return the soffice process to stop
+
+        Further conversions raise ConversionCancelled until ``interrupted``
+        is cleared, which BatchScheduler.start() does for the next batch.
+        The caller stops the returned process (None when the worker is
+        idle), which aborts the document being converted.
+        """
+        self.interrupted = True
+        return self.active
+
+    def stop(self):
+        """Shut soffice down, giving it a chance to exit cleanly"""
+        if self.active is not None:
+            stop_process(self.active, grace=CANCEL_GRACE)
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.kill()
+            self.process = None
+
+    def restart(self):
+        """Replace a crashed or hung soffice with a fresh one"""
+        self.kill()
+        self.process = None
+        self.start()
+
+    def reset_profile(self):
+        """Throw away soffice and its profile after a crash; restart lazily"""
+        self.kill()
+        self.process = None
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+        self.profile_dir = tempfile.mkdtemp(prefix=f"pdfconv-w{self.worker_id}-")
+        self.converted = 0
+
+    def close(self):
+        """Stop soffice and remove the private profile and scratch folder"""
+        self.stop()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+    def clear_scratch(self):
+        """Delete leftovers so a PDF in scratch is always from the current run"""
+        for name in os.listdir(self.scratch_dir):
+            try:
+                os.remove(os.path.join(self.scratch_dir, name))
+            except OSError:
+                pass
+
+    def convert(self, path, output, job=None, timeout=None):
+        """Convert one document to the PDF path ``output`` and return it
+
+        The PDF is rendered in the worker's scratch folder and moved into
+        place only when complete. If a Job is given, its spawned_at/
+        rendered_at timestamps and returncode are filled in as the
+        conversion progresses. ``timeout`` overrides the worker's default
+        budget for this document.
+        """
+        scratch = output_path(path, self.scratch_dir)
+        timeout = timeout or self.timeout
+        self.clear_scratch()
+        if self.warm:
+            if not self.healthy():
+                self.restart()
+            mark(job, 'spawned_at')
+            self.active = self.process
+            try:
+                self.convert_warm(os.path.abspath(path), scratch, timeout)
+            finally:
+                self.active = None
+                mark(job, 'rendered_at')
+        else:
+            self.convert_cold(path, self.scratch_dir, scratch, job, timeout)
+        if not os.path.exists(scratch):
+            raise ConversionError("LibreOffice did not produce a PDF")
+        self.converted += 1
+        return publish_file(scratch, output)
+
+    def convert_cold(self, path, output_dir, output, job=None, timeout=None):
+        """Run a one-shot soffice --convert-to for a single file"""
+        try:
+            returncode, stderr = self.convert_to([path], output_dir, [job], timeout)
+        finally:
+            mark(job, 'rendered_at')
+        if job is not None:
+            job.returncode = returncode
+        self.check_exit(returncode, stderr)
+        # soffice exits 0 even when it could not load the file
+        if not os.path.exists(output):
+            raise ConversionError(stderr or "Unknown error", returncode=returncode, stderr=stderr)
+
+    def convert_to(self, paths, output_dir, jobs=(), timeout=None):
+        """Run soffice --convert-to over some files and return (exit code, stderr)"""
+        timeout = timeout or self.timeout
+        if self.interrupted:
+            raise ConversionCancelled("Conversion cancelled")
+        cmd = self.base_command() + ['--convert-to', 'pdf', '--outdir', output_dir] + list(paths)
+        # In its own process group so soffice.bin can be stopped with it
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                   start_new_session=True)
+        self.active = process
+        for job in jobs:
+            mark(job, 'spawned_at')
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            stop_process(process)
+            process.communicate()
+            raise ConversionTimeout(f"Conversion took longer than {timeout:.0f}s")
+        finally:
+            self.active = None
+        if self.interrupted:
+            raise ConversionCancelled("Conversion cancelled")
+        return process.returncode, stderr
+
+    @staticmethod
+    def check_exit(returncode, stderr):
+        """Raise for an soffice run that crashed or reported failure"""
+        # Killed by a signal, or the launcher reporting a crashed soffice.bin
+        if returncode < 0 or returncode >= 128:
+            raise ConversionCrash(stderr or f"LibreOffice crashed (exit code {returncode})",
+                                  returncode=returncode, stderr=stderr)
+        if returncode != 0:
+            raise ConversionError(stderr or "Unknown error", returncode=returncode, stderr=stderr)
+
+    def convert_batch(self, jobs, timeout=None):
+        """Convert several documents in one soffice run
+
+        Returns the error that ended the run early, or None. Every job
+        whose PDF appeared is published to its ``target`` and gets
+        ``output`` set; the rest are left alone so the caller can tell
+        which documents still need converting.
+        """
+        self.clear_scratch()
+        error = None
+        try:
+            returncode, stderr = self.convert_to([job.path for job in jobs], self.scratch_dir, jobs, timeout)
+            for job in jobs:
+                job.returncode = returncode
+            self.check_exit(returncode, stderr)
+        except ConversionError as e:
+            error = e
+        for job in jobs:
+            mark(job, 'rendered_at')
+            produced = output_path(job.path, self.scratch_dir)
+            # A run killed mid-export can leave a truncated PDF behind
+            if os.path.exists(produced) and (error is None or pdf_complete(produced)):
+                job.output = publish_file(produced, job.target)
+                self.converted += 1
+        if error is None and any(job.output is None for job in jobs):
+            error = ConversionError(stderr or "LibreOffice did not produce a PDF",
+                                    returncode=returncode, stderr=stderr)
+        return error
+
+    def convert_warm(self, path, output, timeout=None):
+        """Load, export and close a document in the running soffice"""
+        timeout = timeout or self.timeout
+        # A hung document blocks the UNO call, so kill soffice to unblock it
+        self.timed_out = False
+        watchdog = threading.Timer(timeout, self.on_timeout)
+        watchdog.start()
+        try:
+            doc = self.desktop.loadComponentFromURL(
+                self.uno.systemPathToFileUrl(path), "_blank", 0,
+                (self.property("Hidden", True),))
+            if doc is None:
+                raise ConversionError("LibreOffice could not open the document")
+            try:
+                doc.storeToURL(self.uno.systemPathToFileUrl(output),
+                               (self.property("FilterName", self.export_filter(doc)),))
+            finally:
+                doc.close(True)
+        except ConversionError:
+            raise
+        except Exception as e:
+            if self.interrupted:
+                raise ConversionCancelled("Conversion cancelled")
+            if self.timed_out:
+                raise ConversionTimeout(f"Conversion took longer than {timeout:.0f}s")
+            if self.process.poll() is not None:
+                self.desktop = None
+                raise ConversionCrash(f"LibreOffice crashed: {e}", returncode=self.process.returncode)
+            raise ConversionError(str(e))
+        finally:
+            watchdog.cancel()
+
+    def on_timeout(self):
+        """Watchdog callback for a conversion that ran too long"""
+        self.timed_out = True
+        self.kill()
+
+    def property(self, name, value):
+        """Build a UNO PropertyValue"""
+        prop = self.uno.createUnoStruct("com.sun.star.beans.PropertyValue")
+        prop.Name = name
+        prop.Value = value
+        return prop
+
+    @staticmethod
+    def export_filter(doc):
+        """Pick the PDF export filter matching the document type"""
+        if doc.supportsService("com.sun.star.sheet.SpreadsheetDocument"):
+            return "calc_pdf_Export"
+        if doc.supportsService("com.sun.star.presentation.PresentationDocument"):
+            return "impress_pdf_Export"
+        if doc.supportsService("com.sun.star.drawing.DrawingDocument"):
+            return "draw_pdf_Export"
+        return "writer_pdf_Export"
+
+
+class WorkerPool:
+    """A fixed set of SofficeWorkers shared by all conversions"""
+
+    def __init__(self, binary, size=1, timeout=60, use_uno=True):
+        self.workers = [SofficeWorker(binary, i, timeout, use_uno) for i in range(size)]
+
+    def shutdown(self):
+        """Stop every worker and delete their profiles"""
+        for worker in self.workers:
+            worker.close()
+
+
+class ConversionCache:
+    """On-disk LRU cache of converted PDFs keyed by source content
+
+    Keys hash the document bytes together with the LibreOffice version
+    and CONVERSION_OPTIONS, so upgrading LibreOffice or changing export
+    settings never serves a stale PDF. Entries are evicted least recently
+    used first once the cache grows past ``max_bytes``.
+
+    Several processes may share the folder. The index records when each
+    entry was last used; save() merges it with the index on disk under a
+    file lock, and load() also counts PDFs no index lists, such as those
+    stored by a process that crashed before saving.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_BYTES, version='unknown',
+                 options=CONVERSION_OPTIONS):
+        self.directory = directory or os.path.join(user_cache_dir(), 'pdfs')
+        self.index_path = os.path.join(self.directory, 'index.json')
+        self.max_bytes = max_bytes
+        self.version = version
+        self.options = options
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # key -> size in bytes, least recently used first
+        self.entries = collections.OrderedDict()
+        # key -> wall-clock time of the last store or hit
+        self.used = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self.load()
+
+    def read_index(self):
+        """{key: (size, last used)} from the index on disk, for PDFs still present"""
+        try:
+            with open(self.index_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = []
+        index = {}
+        for entry in entries:
+            # Older indexes have no last-used time
+            key, size, used = (entry + [0])[:3]
+            if os.path.exists(self.entry_path(key)):
+                index[key] = (size, used)
+        return index
+
+    def scan(self):
+        """{key: (size, mtime)} of every PDF in the cache folder"""
+        found = {}
+        for path in glob.glob(os.path.join(glob.escape(self.directory), '??', '*.pdf')):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            found[os.path.basename(path)[:-4]] = (st.st_size, st.st_mtime)
+        return found
+
+    def merge(self, index):
+        """Fold {key: (size, last used)} into the LRU order, keeping the later use"""
+        with self.lock:
+            for key, (size, used) in index.items():
+                if key not in self.entries or used > self.used.get(key, 0):
+                    self.entries[key] = size
+                    self.used[key] = used
+            order = sorted(self.entries, key=lambda key: self.used.get(key, 0))
+            self.entries = collections.OrderedDict((key, self.entries[key]) for key in order)
+            self.evict()
+
+    def load(self):
+        """Read the LRU index plus any PDFs it doesn't list, then enforce max_bytes"""
+        found = self.scan()
+        index = self.read_index()
+        for key, (size, mtime) in found.items():
+            if key not in index:
+                index[key] = (size, mtime)
+        self.merge(index)
+
+    def save(self):
+        """Merge this process's entries into the index on disk and write it atomically
+
+        A lock file keeps concurrent savers from dropping each other's
+        entries; without fcntl (Windows) the merge still narrows the race.
+        """
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        with open(self.index_path + '.lock', 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            with self.lock:
+                # Entries another process has evicted since
+                for key in [key for key in self.entries if not os.path.exists(self.entry_path(key))]:
+                    del self.entries[key]
+                    self.used.pop(key, None)
+            self.merge(self.read_index())
+            with self.lock:
+                data = [[key, size, self.used.get(key, 0)] for key, size in self.entries.items()]
+            tmp = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.index_path)
+
+    @property
+    def size(self):
+        """Total bytes of cached PDFs"""
+        return sum(self.entries.values())
+
+    def entry_path(self, key):
+        """File holding the cached PDF for a key"""
+        return os.path.join(self.directory, key[:2], key + '.pdf')
+
+    def key(self, path, variant=''):
+        """Hash a source document together with the conversion settings
+
+        ``variant`` names post-processing applied to the cached PDF, such
+        as an optimization preset, so each variant is cached separately.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{self.version}\0{self.options}\0".encode())
+        if variant:
+            digest.update(f"{variant}\0".encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def lookup(self, key):
+        """Return the cached PDF for a key, or None on a miss"""
+        with self.lock:
+            if key in self.entries and os.path.exists(self.entry_path(key)):
+                self.entries.move_to_end(key)
+                self.used[key] = time.time()
+                self.hits += 1
+                return self.entry_path(key)
+            self.entries.pop(key, None)
+            self.used.pop(key, None)
+            self.misses += 1
+            return None
+
+    def store(self, key, pdf):
+        """Copy a freshly converted PDF into the cache"""
+        entry = self.entry_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = f"{entry}.{threading.get_ident()}.tmp"
+        shutil.copyfile(pdf, tmp)
+        os.replace(tmp, entry)
+        with self.lock:
+            self.entries[key] = os.path.getsize(entry)
+            self.entries.move_to_end(key)
+            self.used[key] = time.time()
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until under max_bytes; call with the lock held"""
+        total = self.size
+        while total > self.max_bytes and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.used.pop(key, None)
+            total -= size
+            try:
+                os.remove(self.entry_path(key))
+            except OSError:
+                pass
+
+    @staticmethod
+    def publish(cached, dest):
+        """Copy a cached PDF to dest unless an identical file is already there
+
+        Copies rather than hardlinks: LibreOffice rewrites existing PDFs in
+        place, which would silently change a linked cache entry.
+        """
+        if os.path.exists(dest) and filecmp.cmp(cached, dest, shallow=False):
+            return dest
+        return publish_file(cached, dest, move=False)
+
+
+class ThroughputModel:
+    """Per-extension estimate of conversion time from file size
+
+    Fits seconds = overhead + per_mb * size with an exponentially decayed
+    least-squares regression over past conversions, so recent runs on this
+    machine count most. Persisted between runs as a small JSON file.
+    """
+
+    # (overhead seconds, seconds per MB) until enough history exists
+    DEFAULTS = {'.xls': (3.0, 2.0), '.xlsx': (3.0, 2.0), '.ods': (3.0, 2.0),
+                '.ppt': (3.0, 2.0), '.pptx': (3.0, 2.0), '.odp': (3.0, 2.0)}
+    FALLBACK = (3.0, 1.0)
+    DECAY = 0.95
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(user_cache_dir(), 'throughput.json')
+        self.lock = threading.Lock()
+        # ext -> decayed sums [n, sum_x, sum_y, sum_xx, sum_xy]
+        self.stats = {}
+        try:
+            with open(self.path) as f:
+                self.stats = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        """Persist the learned statistics"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.stats)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+    def observe(self, ext, size, seconds):
+        """Learn from one successful conversion"""
+        x = size / 1024 ** 2
+        with self.lock:
+            n, sx, sy, sxx, sxy = (v * self.DECAY for v in self.stats.get(ext, [0, 0, 0, 0, 0]))
+            self.stats[ext] = [n + 1, sx + x, sy + seconds, sxx + x * x, sxy + x * seconds]
+
+    def coefficients(self, ext):
+        """Return (overhead, seconds per MB) for an extension"""
+        overhead, per_mb = self.DEFAULTS.get(ext, self.FALLBACK)
+        with self.lock:
+            stats = self.stats.get(ext)
+        if not stats or stats[0] < 1:
+            return overhead, per_mb
+        n, sx, sy, sxx, sxy = stats
+        mean_x, mean_y = sx / n, sy / n
+        variance = sxx / n - mean_x ** 2
+        if n >= 3 and variance > 1e-6:
+            per_mb = max(0.0, (sxy / n - mean_x * mean_y) / variance)
+        # Anchor the line on the observed mean, keeping the default slope if unfitted
+        overhead = max(0.0, mean_y - per_mb * mean_x)
+        return overhead, per_mb
+
+    def predict(self, path, size):
+        """Expected conversion time in seconds"""
+        overhead, per_mb = self.coefficients(Path(path).suffix.lower())
+        return overhead + per_mb * size / 1024 ** 2
+
+    def timeout(self, path, size):
+        """Time budget for converting a document"""
+        return min(MAX_TIMEOUT, max(MIN_TIMEOUT, TIMEOUT_FACTOR * self.predict(path, size)))
+
+
+def format_duration(seconds):
+    """Format seconds as a short human-readable duration"""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+
+def format_size(size):
+    """Format a byte count as a short human-readable size"""
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def default_jobs():
+    """Default number of parallel conversions: one per CPU"""
+    return os.cpu_count() or 1
+
+
+class Job:
+    """One document queued for conversion"""
+
+    __slots__ = ('index', 'path', 'state', 'output', 'target', 'error', 'cached', 'worker', 'returncode',
+                 'input_size', 'output_size', 'optimized_size', 'optimize_error', 'attempts', 'budget',
+                 'estimate', 'output_dir', 'tag', 'key',
+                 'queued_at', 'started_at', 'spawned_at', 'rendered_at', 'finished_at')
+
+    def __init__(self, index, path, output_dir=None, tag=None):
+        self.index = index
+        self.path = path
+        # Overrides the scheduler's output folder for this job
+        self.output_dir = output_dir
+        # Caller data carried along to on_update callbacks
+        self.tag = tag
+        # Content hash of the source, set when a cache is in use
+        self.key = None
+        self.state = 'queued'
+        self.output = None
+        # Where the PDF will be published, chosen when the job is queued
+        self.target = None
+        self.error = None
+        self.cached = False
+        self.worker = None
+        self.returncode = None
+        self.input_size = None
+        self.output_size = None
+        # PDF size after PdfOptimizer, and why it was left as is if it failed
+        self.optimized_size = None
+        self.optimize_error = None
+        self.attempts = 0
+        # Time budget in seconds for the next attempt
+        self.budget = None
+        # Predicted conversion time in seconds, used for ordering and ETAs
+        self.estimate = None
+        # Wall-clock timestamps for each phase, see job_phases()
+        self.queued_at = time.time()
+        self.started_at = None
+        self.spawned_at = None
+        self.rendered_at = None
+        self.finished_at = None
+
+
+class JobQueue:
+    """Thread-safe job queue that knows when a batch has drained
+
+    Jobs come out in submission order or, with ``largest_first``, longest
+    estimated conversion first (LPT), which keeps big files from starting
+    last and stretching the batch while other workers sit idle. Retried
+    jobs always queue behind fresh ones.
+    """
+
+    def __init__(self, largest_first=False):
+        self.cond = threading.Condition()
+        self.largest_first = largest_first
+        # Heap of (is_retry, -estimate, sequence, job)
+        self.pending = []
+        self.sequence = itertools.count()
+        self.active = 0
+        self.closed = False
+        self.paused = False
+
+    def __len__(self):
+        return len(self.pending)
+
+    def pause(self):
+        """Stop handing out jobs; jobs already taken keep running"""
+        with self.cond:
+            self.paused = True
+
+    def resume(self):
+        with self.cond:
+            self.paused = False
+            self.cond.notify_all()
+
+    def cancel(self):
+        """Close the queue and remove and return every job still waiting"""
+        with self.cond:
+            jobs = [entry[-1] for entry in sorted(self.pending)]
+            self.pending.clear()
+            self.closed = True
+            self.paused = False
+            self.cond.notify_all()
+        return jobs
+
+    def discard(self, job):
+        """Remove a job that is still waiting; False if a worker has taken it"""
+        with self.cond:
+            for i, entry in enumerate(self.pending):
+                if entry[-1] is job:
+                    self.pending[i] = self.pending[-1]
+                    self.pending.pop()
+                    heapq.heapify(self.pending)
+                    self.cond.notify_all()
+                    return True
+        return False
+
+    def put(self, job, retry=False):
+        """Queue a job for the next free worker"""
+        cost = (job.estimate or 0) if self.largest_first else 0
+        with self.cond:
+            heapq.heappush(self.pending, (retry, -cost, next(self.sequence), job))
+            self.cond.notify()
+
+    def close(self):
+        """No more jobs will be added; idle workers may exit once drained"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def get(self, limit=1, workers=1):
+        """Block until jobs are available, or return None when the batch is done
+
+        Returns a list of up to ``limit`` jobs. Jobs after the first share
+        its extension and have distinct names, so one soffice --convert-to
+        run can produce all of them; they are looked
+        for among the next few queued jobs in priority order. A chunk never
+        takes more than an even share of the queue across ``workers``, and
+        retries always run alone.
+        """
+        with self.cond:
+            while self.paused or not self.pending:
+                if not self.pending and self.closed and self.active == 0:
+                    return None
+                self.cond.wait()
+            retry, _, _, first = heapq.heappop(self.pending)
+            batch = [first]
+            limit = min(limit, -(-(len(self.pending) + 1) // workers))
+            if not retry and limit > 1:
+                suffix = Path(first.path).suffix.lower()
+                names = {Path(first.path).stem}
+                skipped = []
+                while len(batch) < limit and self.pending and len(skipped) < 8 * limit:
+                    entry = heapq.heappop(self.pending)
+                    job = entry[-1]
+                    name = Path(job.path).stem
+                    if not entry[0] and Path(job.path).suffix.lower() == suffix and name not in names:
+                        batch.append(job)
+                        names.add(name)
+                    else:
+                        skipped.append(entry)
+                for entry in skipped:
+                    heapq.heappush(self.pending, entry)
+            self.active += len(batch)
+            return batch
+
+    def task_done(self):
+        """Mark one job returned by get() as finished"""
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+
+class OutputNames:
+    """Which source document owns each PDF name in an output folder
+
+    The first document with a given name gets ``name.pdf``; later ones
+    with the same name get their extension added (``name (xlsx).pdf``)
+    and then a counter, so the result depends only on the order files
+    were queued, and a source queued again keeps its earlier PDF name.
+    With a ``state_path`` the claims survive restarts, which watch mode
+    needs so a document converted after a restart can't take over a PDF
+    name another document already owns. Claims whose PDF has been deleted
+    are dropped when the state is loaded.
+    """
+
+    def __init__(self, output_dir, state_path=None):
+        self.output_dir = output_dir
+        self.state_path = state_path
+        self.lock = threading.Lock()
+        self.dirty = False
+        # Source path -> PDF name, and casefolded PDF name -> source path
+        self.targets = {}
+        self.claimed = {}
+        if state_path is not None:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.state_path) as f:
+                targets = json.load(f)
+        except (OSError, ValueError):
+            return
+        for source, name in targets.items():
+            if os.path.exists(os.path.join(self.output_dir, name)):
+                self.targets[source] = name
+                self.claimed[name.casefold()] = source
+
+    def save(self):
+        """Write the claims if anything changed"""
+        if self.state_path is None:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.targets)
+            self.dirty = False
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, self.state_path)
+
+    def target(self, path):
+        """PDF path for a source document, claiming a free name on first use"""
+        source = os.path.abspath(path)
+        with self.lock:
+            if source not in self.targets:
+                stem = Path(path).stem
+                kind = Path(path).suffix.lower().lstrip('.')
+                names = itertools.chain([f"{stem}.pdf", f"{stem} ({kind}).pdf"],
+                                        (f"{stem} ({kind} {n}).pdf" for n in itertools.count(2)))
+                # Compared case-insensitively for macOS and Windows shares
+                name = next(name for name in names if name.casefold() not in self.claimed)
+                self.claimed[name.casefold()] = source
+                self.targets[source] = name
+                self.dirty = True
+            return os.path.join(self.output_dir, self.targets[source])
+
+    def reserve(self, name):
+        """Claim a PDF name for output that isn't a document's, such as a merge
+
+        Returns the path, numbered (``merged (2).pdf``) if a document
+        already holds the name.
+        """
+        stem = Path(name).stem
+        names = itertools.chain([name], (f"{stem} ({n}).pdf" for n in itertools.count(2)))
+        with self.lock:
+            name = next(name for name in names if name.casefold() not in self.claimed)
+            self.claimed[name.casefold()] = None
+        return os.path.join(self.output_dir, name)
+
+
+class BatchScheduler:
+    """Hands queued files to the pool's workers, one thread per worker
+
+    ``on_update`` is called from worker threads every time a job changes
+    state, so GUI callers must marshal it back onto their own loop.
+    """
+
+    def __init__(self, pool, output_dir, on_update=None, cache=None, model=None, timeout=None,
+                 largest_first=False, retain=True, batch_size=BATCH_SIZE, journal=None, optimizer=None,
+                 names=None):
+        self.pool = pool
+        self.output_dir = output_dir
+        self.on_update = on_update
+        # BatchJournal recording every state change, for resuming after a crash
+        self.journal = journal
+        # PdfOptimizer every converted PDF passes through before it counts as done;
+        # the cache then holds the optimized PDF, keyed by the preset
+        self.optimizer = optimizer
+        self.cache = cache
+        self.model = model
+        # Fixed per-document budget in seconds, instead of the model's estimate
+        self.timeout = timeout
+        self.jobs = JobQueue(largest_first)
+        # Documents per soffice run on workers without a UNO connection
+        self.batch_size = max(1, batch_size)
+        # Long-running services pass retain=False so finished jobs are freed
+        self.retain = retain
+        self.submitted = []
+        self.count = 0
+        # PDF names handed out in output_dir; callers may pass a persisted OutputNames
+        self.names = names or OutputNames(output_dir)
+        self.lock = threading.Lock()
+        self.succeeded = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.cancel_requested = False
+        self.threads = []
+        # Estimated seconds of work not yet finished, and the jobs running now
+        self.outstanding = 0.0
+        self.running = set()
+
+    def submit(self, path, output_dir=None, tag=None):
+        """Queue a document and return its Job"""
+        with self.lock:
+            job = Job(self.count, path, output_dir, tag)
+            job.target = self.target_path(path, output_dir)
+            self.count += 1
+            if self.retain:
+                self.submitted.append(job)
+        if self.model is not None:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            job.estimate = self.model.predict(path, size)
+            with self.lock:
+                self.outstanding += job.estimate
+        if self.journal is not None:
+            self.journal.record(job)
+        self.jobs.put(job)
+        return job
+
+    def carry_over(self, path, tag=None):
+        """Record a document converted by an earlier run of the batch
+
+        The returned 'done' Job keeps its PDF name and its place in the
+        queue order, so it can still be merged, but it isn't converted
+        and isn't counted in ``submitted``.
+        """
+        with self.lock:
+            job = Job(self.count, path, tag=tag)
+            job.target = job.output = self.target_path(path)
+            self.count += 1
+        job.state = 'done'
+        if self.journal is not None:
+            self.journal.converted(path, job.output)
+        return job
+
+    def target_path(self, path, output_dir=None):
+        """Pick a PDF path that no other document will use, see OutputNames
+
+        Jobs with their own output folder are left as they are.
+        """
+        if output_dir is not None:
+            return output_path(path, output_dir)
+        return self.names.target(path)
+
+    def eta(self):
+        """Estimated seconds until the batch finishes, or None without a model"""
+        if self.model is None:
+            return None
+        now = time.time()
+        with self.lock:
+            in_progress = sum(min(job.estimate, now - job.started_at) for job in self.running)
+            remaining = max(0.0, self.outstanding - in_progress)
+        return remaining / len(self.pool.workers)
+
+    def close(self):
+        """Signal that no more files will be submitted"""
+        self.jobs.close()
+
+    @property
+    def paused(self):
+        return self.jobs.paused
+
+    def pause(self):
+        """Let running documents finish but start no new ones"""
+        self.jobs.pause()
+
+    def resume(self):
+        """Continue a paused batch where it stopped"""
+        self.jobs.resume()
+
+    def cancel(self):
+        """Stop the batch: drop queued documents and abort running ones
+
+        Aborted and dropped jobs end up 'cancelled', not failed, and PDFs
+        finished before the cancel are kept. Blocks for up to CANCEL_GRACE
+        seconds in total while soffice processes exit.
+        """
+        self.cancel_requested = True
+        for job in self.jobs.cancel():
+            job.state = 'cancelled'
+            self.report(job)
+        processes = [worker.interrupt() for worker in self.pool.workers]
+        stop_processes([process for process in processes if process is not None], grace=CANCEL_GRACE)
+
+    def withdraw(self, job):
+        """Cancel one job if no worker has started it yet, returning whether it was"""
+        if not self.jobs.discard(job):
+            return False
+        job.state = 'cancelled'
+        self.report(job)
+        return True
+
+    def start(self):
+        """Start one scheduling thread per pool worker"""
+        for worker in self.pool.workers:
+            worker.interrupted = False
+            thread = threading.Thread(target=self.run_worker, args=(worker,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def wait(self):
+        """Block until every submitted job has finished"""
+        for thread in self.threads:
+            thread.join()
+        if self.optimizer is not None:
+            self.optimizer.close()
+
+    def run_worker(self, worker):
+        """Convert jobs on one worker until the queue drains"""
+        # Cold workers pay soffice's startup on every run, so they take chunks
+        limit = 1 if worker.warm else self.batch_size
+        while True:
+            batch = self.jobs.get(limit, len(self.pool.workers))
+            if batch is None:
+                return
+            for job in batch:
+                job.state = 'running'
+                job.worker = worker.worker_id
+                job.attempts += 1
+                mark(job, 'started_at')
+            with self.lock:
+                self.running.update(batch)
+            try:
+                for job in batch:
+                    self.notify(job)
+                if self.cancel_requested:
+                    raise ConversionCancelled("Conversion cancelled")
+                if len(batch) == 1:
+                    self.run_job(worker, batch[0])
+                else:
+                    self.run_batch(worker, batch)
+            except ConversionCancelled as e:
+                for job in batch:
+                    if job.state == 'running':
+                        self.fail(worker, job, e)
+            except Exception as e:
+                for job in batch:
+                    if job.state == 'running':
+                        job.error = ConversionError(str(e))
+                        job.state = 'failed'
+            finally:
+                for job in batch:
+                    mark(job, 'finished_at')
+                    with self.lock:
+                        self.running.discard(job)
+                    self.jobs.task_done()
+            for job in batch:
+                self.report(job)
+
+    def run_job(self, worker, job):
+        """Convert a single job, requeueing it if it may succeed on retry"""
+        try:
+            job.input_size = os.path.getsize(job.path)
+            job.output = self.convert_job(worker, job)
+            self.complete(job)
+        except ConversionError as e:
+            self.fail(worker, job, e)
+
+    def run_batch(self, worker, jobs):
+        """Convert same-type jobs together, serving cache hits first"""
+        keys = {}
+        pending = []
+        for job in jobs:
+            try:
+                job.input_size = os.path.getsize(job.path)
+                keys[job], job.output = self.from_cache(job)
+            except OSError as e:
+                self.fail(worker, job, ConversionError(str(e)))
+                continue
+            if job.output is not None:
+                self.complete(job)
+            else:
+                pending.append(job)
+        if pending:
+            self.convert_chunk(worker, pending)
+        for job in pending:
+            if job.output is None:
+                self.fail(worker, job, job.error)
+                continue
+            if keys[job] is not None and self.optimizer is None:
+                self.cache.store(keys[job], job.output)
+            self.complete(job)
+
+    def convert_chunk(self, worker, jobs):
+        """Convert jobs in one soffice run, bisecting a run that dies part-way
+
+        A document soffice simply couldn't load is reported on its own.
+        When the whole run crashes or times out, the documents it didn't
+        get to are split in half and retried until the culprit is alone.
+        """
+        # A first run also initialises the worker's profile, so its time
+        # says little about the documents and isn't learnt from
+        first = worker.converted == 0
+        budget = sum(self.budget(worker, job) or worker.timeout for job in jobs)
+        if first and self.timeout is None:
+            budget += WORKER_START_TIMEOUT
+        error = worker.convert_batch(jobs, timeout=budget)
+
+        missing = [job for job in jobs if job.output is None]
+        ran_to_end = error is None or error.returncode == 0 or isinstance(error, ConversionCancelled)
+        if self.model is not None and not first and ran_to_end and len(missing) < len(jobs):
+            # Share the run's time out by each document's expected cost
+            elapsed = jobs[0].rendered_at - jobs[0].spawned_at
+            total = sum(job.estimate or 1 for job in jobs)
+            for job in jobs:
+                if job.output is not None:
+                    self.model.observe(Path(job.path).suffix.lower(), job.input_size,
+                                       elapsed * (job.estimate or 1) / total)
+
+        if len(missing) == 1 or ran_to_end:
+            # Includes a cancelled run: there's nothing to bisect
+            for job in missing:
+                job.error = error
+        elif missing:
+            half = len(missing) // 2
+            self.convert_chunk(worker, missing[:half])
+            self.convert_chunk(worker, missing[half:])
+
+    def complete(self, job):
+        job.output_size = os.path.getsize(job.output)
+        job.state = 'done'
+
+    def fail(self, worker, job, error):
+        job.error = error
+        job.returncode = error.returncode
+        if isinstance(error, ConversionCancelled):
+            job.state = 'cancelled'
+            return
+        job.state = 'failed'
+        self.retry(worker, job)
+
+    def report(self, job):
+        """Update the batch totals for a finished job and tell the caller"""
+        if job.state == 'queued':
+            # Requeued only now, so no other worker can finish it before this report
+            try:
+                self.notify(job)
+            finally:
+                self.jobs.put(job, retry=True)
+            return
+        if job.state == 'done' and self.optimizer is not None and not job.cached:
+            # Reported by optimized() once the optimizer is done with it
+            self.optimizer.submit(job, self.optimized)
+            return
+        self.finish(job)
+
+    def optimized(self, job):
+        """Cache an optimized PDF and report its job"""
+        # When optimizing failed the PDF is as LibreOffice wrote it, and must
+        # not be served later as the optimized variant
+        if job.key is not None and job.optimize_error is None:
+            try:
+                self.cache.store(job.key, job.output)
+            except OSError:
+                pass
+        self.finish(job)
+
+    def finish(self, job):
+        with self.lock:
+            self.outstanding -= job.estimate or 0
+            if job.state == 'done':
+                self.succeeded += 1
+            elif job.state == 'cancelled':
+                self.cancelled += 1
+            else:
+                self.failed += 1
+        self.notify(job)
+
+    def from_cache(self, job):
+        """Return the job's cache key and its cached PDF, published, if any"""
+        if self.cache is None:
+            return None, None
+        variant = self.optimizer.variant if self.optimizer is not None else ''
+        key = job.key = self.cache.key(job.path, variant)
+        cached = self.cache.lookup(key)
+        if cached is None:
+            return key, None
+        job.cached = True
+        return key, self.cache.publish(cached, job.target)
+
+    def budget(self, worker, job):
+        """Time limit for one attempt at a job, or None for the worker default"""
+        if job.budget is None:
+            if self.timeout is not None:
+                job.budget = self.timeout
+            elif self.model is not None:
+                job.budget = self.model.timeout(job.path, job.input_size)
+        return job.budget
+
+    def convert_job(self, worker, job):
+        """Serve a job from the cache or convert it on a worker"""
+        key, output = self.from_cache(job)
+        if output is not None:
+            return output
+
+        budget = self.budget(worker, job)
+        # A fresh profile is initialised on first use, which takes a while,
+        # so the first conversion's time isn't learnt from either
+        first = worker.converted == 0
+        if budget is not None and first and self.timeout is None:
+            budget += WORKER_START_TIMEOUT
+        output = worker.convert(job.path, job.target, job, timeout=budget)
+
+        if self.model is not None and not first:
+            self.model.observe(Path(job.path).suffix.lower(), job.input_size,
+                               job.rendered_at - job.spawned_at)
+        if key is not None and self.optimizer is None:
+            self.cache.store(key, output)
+        return output
+
+    def retry(self, worker, job):
+        """Mark a timed-out or crashed job for another attempt
+
+        Timeouts get a doubled budget; crashes get a fresh profile. Either
+        way the next attempt runs on a freshly started soffice. report()
+        puts the job back at the end of the queue.
+        """
+        error = job.error
+        if job.attempts > MAX_RETRIES:
+            return
+        if isinstance(error, ConversionTimeout):
+            job.budget = min(MAX_TIMEOUT, 2 * (job.budget or worker.timeout))
+        elif isinstance(error, ConversionCrash):
+            worker.reset_profile()
+        else:
+            return
+        job.state = 'queued'
+        job.spawned_at = job.rendered_at = None
+
+    def notify(self, job):
+        """Report a job state change to the caller"""
+        if self.journal is not None:
+            self.journal.record(job)
+        if self.on_update is not None:
+            self.on_update(job)
+
+
+def iter_documents(root):
+    """Walk a folder tree with os.scandir, yielding Office documents as found
+
+    Each directory is listed once and its documents are yielded before
+    descending, so callers can start converting long before a deep tree
+    has been fully scanned. Symlinked folders and unreadable folders are
+    skipped.
+    """
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subfolders = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subfolders.append(entry.path)
+                elif entry.name.lower().endswith(OFFICE_EXTENSIONS) and entry.is_file():
+                    yield entry.path
+            except OSError:
+                continue
+        # Reversed so the stack pops subfolders in name order
+        stack.extend(reversed(subfolders))
+
+
+def expand_inputs(inputs):
+    """Yield the documents named by files, directories or glob patterns"""
+    for item in inputs:
+        if glob.has_magic(item):
+            matches = sorted(glob.glob(item, recursive=True))
+        else:
+            matches = [item]
+        for match in matches:
+            if os.path.isdir(match):
+                yield from iter_documents(match)
+            else:
+                yield match
+
+
+def convert(paths, output_dir, jobs=None, binary=None, on_update=None, pool=None, cache=None,
+            model=None, timeout=None, largest_first=False, batch_size=BATCH_SIZE, optimizer=None):
+    """Convert documents to PDF in output_dir and return their Jobs
+
+    This is the headless entry point used by the CLI. Pass an existing
+    ``pool`` to keep LibreOffice warm across calls; otherwise a pool of
+    ``jobs`` workers is started and shut down around this batch. With a
+    ConversionCache, unchanged documents are served without LibreOffice;
+    with a ThroughputModel, each document gets a size-based time budget
+    (unless a fixed ``timeout`` is given) and ``largest_first`` orders the
+    queue longest-estimated-job first. Without a UNO bridge, up to
+    ``batch_size`` documents of one type share each soffice run. A
+    PdfOptimizer shrinks each PDF before its job is reported done.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    own_pool = pool is None
+    if own_pool:
+        pool = WorkerPool(binary or find_soffice() or 'libreoffice', size=jobs or default_jobs())
+    try:
+        scheduler = BatchScheduler(pool, output_dir, on_update=on_update, cache=cache, model=model,
+                                   timeout=timeout, largest_first=largest_first,
+                                   batch_size=batch_size, optimizer=optimizer)
+        try:
+            # The workers start once there's a full chunk for each of them, so
+            # cold workers can fill their soffice runs and largest_first has a
+            # choice, without waiting for a long folder walk to finish
+            backlog = batch_size * len(pool.workers)
+            for count, path in enumerate(paths, 1):
+                scheduler.submit(path)
+                if count == backlog:
+                    scheduler.start()
+            scheduler.close()
+            if not scheduler.threads:
+                scheduler.start()
+            scheduler.wait()
+        except KeyboardInterrupt:
+            scheduler.cancel()
+            raise
+        return scheduler.submitted
+    finally:
+        if cache is not None:
+            cache.save()
+        if model is not None:
+            model.save()
+        if own_pool:
+            pool.shutdown()
+
+
+def job_phases(job):
+    """Split a job's time into (phase, start, end) spans that actually ran
+
+    queue: waiting for a free worker; spawn: cache lookup and starting
+    soffice; render: LibreOffice converting; write: publishing the PDF.
+    """
+    stamps = [('queue', job.queued_at, job.started_at),
+              ('spawn', job.started_at, job.spawned_at),
+              ('render', job.spawned_at, job.rendered_at),
+              ('write', job.rendered_at or job.started_at, job.finished_at)]
+    return [(name, start, end) for name, start, end in stamps
+            if start is not None and end is not None]
+
+
+def job_record(job):
+    """Describe a finished job as a JSON-serialisable dict"""
+    record = {'path': job.path, 'status': job.state, 'output': job.output, 'cached': job.cached,
+              'worker': job.worker, 'returncode': job.returncode,
+              'input_size': job.input_size, 'output_size': job.output_size,
+              'attempts': job.attempts, 'budget_s': job.budget,
+              'queued_at': job.queued_at, 'started_at': job.started_at,
+              'spawned_at': job.spawned_at, 'rendered_at': job.rendered_at,
+              'finished_at': job.finished_at}
+    if job.optimized_size is not None:
+        record['optimized_size'] = job.optimized_size
+    if job.optimize_error is not None:
+        record['optimize_error'] = job.optimize_error
+    for name, start, end in job_phases(job):
+        record[f'{name}_s'] = round(end - start, 6)
+    if job.error is not None:
+        record['error'] = str(job.error)
+        record['timeout'] = isinstance(job.error, ConversionTimeout)
+    return record
+
+
+def write_run_log(jobs, path):
+    """Write one JSON line per job"""
+    with open(path, 'w') as f:
+        for job in jobs:
+            f.write(json.dumps(job_record(job)) + '\n')
+
+
+# Upper bounds (seconds) of the phase duration histogram buckets
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def prometheus_metrics(jobs, cache=None):
+    """Render batch counters and phase histograms in Prometheus text format"""
+    lines = ['# HELP pdfconv_jobs_total Documents processed, by final status.',
+             '# TYPE pdfconv_jobs_total counter']
+    statuses = collections.Counter(job.state for job in jobs)
+    for status in ('done', 'failed', 'cancelled'):
+        lines.append(f'pdfconv_jobs_total{{status="{status}"}} {statuses[status]}')
+
+    lines += ['# HELP pdfconv_bytes_total Bytes read from sources and written as PDF.',
+              '# TYPE pdfconv_bytes_total counter',
+              f'pdfconv_bytes_total{{direction="in"}} {sum(job.input_size or 0 for job in jobs)}',
+              f'pdfconv_bytes_total{{direction="out"}} {sum(job.output_size or 0 for job in jobs)}']
+
+    if cache is not None:
+        lines += ['# HELP pdfconv_cache_requests_total PDF cache lookups, by result.',
+                  '# TYPE pdfconv_cache_requests_total counter',
+                  f'pdfconv_cache_requests_total{{result="hit"}} {cache.hits}',
+                  f'pdfconv_cache_requests_total{{result="miss"}} {cache.misses}']
+
+    lines += ['# HELP pdfconv_phase_seconds Time spent in each conversion phase.',
+              '# TYPE pdfconv_phase_seconds histogram']
+    durations = collections.defaultdict(list)
+    for job in jobs:
+        for name, start, end in job_phases(job):
+            durations[name].append(end - start)
+    for phase in ('queue', 'spawn', 'render', 'write'):
+        values = durations[phase]
+        for bound in HISTOGRAM_BUCKETS:
+            count = sum(1 for v in values if v <= bound)
+            lines.append(f'pdfconv_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {count}')
+        lines.append(f'pdfconv_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {len(values)}')
+        lines.append(f'pdfconv_phase_seconds_sum{{phase="{phase}"}} {sum(values):.6f}')
+        lines.append(f'pdfconv_phase_seconds_count{{phase="{phase}"}} {len(values)}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_chrome_trace(jobs, path):
+    """Write a chrome://tracing / Perfetto file with one track per worker"""
+    origin = min((job.queued_at for job in jobs), default=0)
+    events = []
+    workers = sorted({job.worker for job in jobs if job.worker is not None})
+    for worker in workers:
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': worker,
+                       'args': {'name': f'worker {worker}'}})
+    for job in jobs:
+        if job.worker is None:
+            continue
+        name = os.path.basename(job.path)
+        for phase, start, end in job_phases(job):
+            if phase == 'queue':
+                continue
+            events.append({'name': f'{phase} {name}', 'cat': phase, 'ph': 'X', 'pid': 1,
+                           'tid': job.worker, 'ts': int((start - origin) * 1e6),
+                           'dur': max(1, int((end - start) * 1e6)),
+                           'args': {'path': job.path, 'status': job.state}})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+class ErrorStore:
+    """Failed jobs of a batch with their full error output, for review and export
+
+    Entries are plain dicts with the FIELDS keys, appended from
+    worker threads and read from any thread.
+    """
+
+    FIELDS = ('path', 'returncode', 'timeout', 'duration_s', 'attempts', 'worker', 'error', 'stderr')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, job):
+        """Record a failed job"""
+        error = job.error
+        duration = None
+        if job.started_at is not None and job.finished_at is not None:
+            duration = round(job.finished_at - job.started_at, 3)
+        entry = {'path': job.path, 'returncode': job.returncode,
+                 'timeout': isinstance(error, ConversionTimeout), 'duration_s': duration,
+                 'attempts': job.attempts, 'worker': job.worker,
+                 'error': str(error) if error is not None else '',
+                 'stderr': getattr(error, 'stderr', '') or ''}
+        with self.lock:
+            self.entries.append(entry)
+
+    def note(self, path, error):
+        """Record a failure that isn't a document's, like a journal that can't be written"""
+        entry = dict.fromkeys(self.FIELDS)
+        entry.update(path=path, timeout=False, error=str(error), stderr='')
+        with self.lock:
+            self.entries.append(entry)
+
+    def clear(self):
+        with self.lock:
+            self.entries = []
+
+    def matching(self, text=''):
+        """Entries whose path or error contains ``text``, ignoring case"""
+        text = text.casefold()
+        with self.lock:
+            entries = list(self.entries)
+        if not text:
+            return entries
+        return [entry for entry in entries
+                if text in entry['path'].casefold() or text in entry['error'].casefold()
+                or text in entry['stderr'].casefold()]
+
+    def export(self, path, entries=None):
+        """Write entries as CSV or, for a .json path, as a JSON array"""
+        if entries is None:
+            entries = self.matching()
+        if path.lower().endswith('.json'):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, indent=1)
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.FIELDS)
+            writer.writeheader()
+            writer.writerows(entries)
+
+
+class BatchJournal:
+    """Append-only JSON lines log of a batch, so it can resume after a crash
+
+    The first line names the output folder and the options that change
+    the PDFs (the optimize preset); after that there is one line
+    per job state change with the source path, its (size, mtime_ns) and,
+    once converted, the PDF path, size and content hash. record() only
+    buffers the line; a background thread appends and fsyncs everything
+    buffered every JOURNAL_INTERVAL seconds, so a crash loses at most the
+    last fraction of a second. A line cut short by the crash is ignored
+    when the journal is read back.
+    """
+
+    def __init__(self, path=None, interval=JOURNAL_INTERVAL):
+        self.path = path or os.path.join(user_cache_dir(), 'journal.jsonl')
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.buffer = []
+        self.file = None
+        self.thread = None
+        self.closing = threading.Event()
+
+    def begin(self, output_dir, optimize=None):
+        """Start a new batch, replacing the previous journal"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.buffer.append({'event': 'batch', 'output_dir': os.path.abspath(output_dir),
+                            'optimize': optimize, 'started_at': time.time()})
+        self.closing.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def record(self, job):
+        """Buffer a job's current state"""
+        entry = {'event': job.state, 'path': job.path}
+        if job.state == 'queued':
+            entry['source'] = signature(job.path)
+        elif job.state == 'done':
+            entry.update(output=job.output, output_size=job.optimized_size or job.output_size,
+                         hash=job.key, source=signature(job.path))
+        with self.lock:
+            self.buffer.append(entry)
+
+    def converted(self, path, output):
+        """Carry over a file converted by an earlier run of the batch"""
+        with self.lock:
+            self.buffer.append({'event': 'done', 'path': path, 'output': output,
+                                'source': signature(path)})
+
+    def run(self):
+        while not self.closing.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """Append and fsync everything buffered so far"""
+        with self.write_lock:
+            with self.lock:
+                entries, self.buffer = self.buffer, []
+            if not entries or self.file is None:
+                return
+            self.file.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        """Write the remaining entries; the journal stays for resume()"""
+        if self.thread is not None:
+            self.closing.set()
+            self.thread.join()
+            self.thread = None
+        self.flush()
+        with self.write_lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def resume(self):
+        """Replay the journal as (output_dir, optimize, [(path, done)]) in queue order
+
+        A file counts as done only if its last recorded state is 'done',
+        its source is unchanged since then and its PDF is still in place.
+        Returns None when there is no journal.
+        """
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return None
+        output_dir = optimize = None
+        last = {}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('event') == 'batch':
+                output_dir = entry.get('output_dir')
+                optimize = entry.get('optimize')
+            elif 'path' in entry:
+                # Updating a key keeps the path at its first, queue-order position
+                last[entry['path']] = entry
+        if output_dir is None:
+            return None
+        files = []
+        for path, entry in last.items():
+            done = False
+            if entry['event'] == 'done' and entry.get('source') == signature(path):
+                pdf = signature(entry['output']) if entry.get('output') else None
+                done = pdf is not None and entry.get('output_size') in (None, pdf[0])
+            files.append((path, done))
+        return output_dir, optimize, files
+
+
+# Object references ("12 0 R") outside strings; the lookarounds keep digits
+# that belong to names or neighbouring numbers from matching
+PDF_REF = re.compile(rb'(?<![^\s\[\]<>(){}%])(\d+)\s+(\d+)\s+R(?![^\s\[\]<>(){}/%])')
+PDF_OBJ = re.compile(rb'\s*(\d+)\s+(\d+)\s+obj')
+PDF_OBJ_END = re.compile(rb'(?<![A-Za-z])(endobj|stream)(?![A-Za-z])')
+PDF_XREF_SECTION = re.compile(rb'\s*(\d+)\s+(\d+)\s*[\r\n]')
+PDF_XREF_ENTRY = re.compile(rb'(\d{10})\s(\d{5})\s([nf])')
+PDF_SPECIAL = re.compile(rb'[(%]')
+PDF_EOL = re.compile(rb'[\r\n]')
+PDF_STARTXREF = re.compile(rb'startxref\s+(\d+)')
+PDF_ENDSTREAM = re.compile(rb'\s*endstream')
+
+
+def pdf_segments(data, start, end=None):
+    """Split ``data[start:end]`` into (start, end, is_code) runs
+
+    Literal strings and comments are returned as non-code runs so that
+    keywords and references inside them are never rewritten.
+    """
+    end = len(data) if end is None else end
+    pos = start
+    while pos < end:
+        special = PDF_SPECIAL.search(data, pos, end)
+        if special is None:
+            yield pos, end, True
+            return
+        if special.start() > pos:
+            yield pos, special.start(), True
+        i = special.start()
+        if data[i] == 0x25:  # comment runs to the end of the line
+            match = PDF_EOL.search(data, i, end)
+            stop = match.start() if match else end
+        else:
+            depth = 0
+            stop = i
+            while stop < end:
+                c = data[stop]
+                if c == 0x5c:  # backslash escapes the next byte
+                    stop += 2
+                    continue
+                if c == 0x28:
+                    depth += 1
+                elif c == 0x29:
+                    depth -= 1
+                    if depth == 0:
+                        stop += 1
+                        break
+                stop += 1
+        yield i, min(stop, end), False
+        pos = stop
+
+
+def pdf_text(text):
+    """Encode a PDF text string, using UTF-16 when it isn't plain ASCII"""
+    if text.isascii() and text.isprintable():
+        escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        return b'(' + escaped.encode('ascii') + b')'
+    return b'<FEFF' + text.encode('utf-16-be').hex().upper().encode('ascii') + b'>'
+
+
+class PdfMergeError(ConversionError):
+    """A PDF could not be appended to a merged document"""
+
+
+class PdfMerger:
+    """Stream several PDFs into one file, with a bookmark per source
+
+    Each source is memory-mapped and only the objects reachable from its
+    page tree are copied, renumbered, straight to the output. The source's
+    page tree root becomes a child of the merged page tree, so inherited
+    page attributes keep working without touching individual pages. Only
+    the object offsets and bookmarks are kept until ``close()`` writes the
+    outline, catalog and cross-reference table. Sources must use classic
+    cross-reference tables, as LibreOffice writes them.
+    """
+
+    CATALOG, PAGES, OUTLINES = 1, 2, 3
+
+    def __init__(self, path):
+        self.path = path
+        self.partial = path + '.part'
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.out = open(self.partial, 'wb')
+        self.out.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+        self.offsets = {}
+        self.next_number = 4
+        self.kids = []
+        self.bookmarks = []
+        self.page_count = 0
+
+    def append(self, source, title):
+        """Copy every page of ``source`` and bookmark its first page"""
+        with open(source, 'rb') as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise PdfMergeError(f"{source} is empty")
+        try:
+            self.copy_document(data, source, title)
+        finally:
+            data.close()
+
+    def copy_document(self, data, source, title):
+        xref, trailer = self.read_xref(data, source)
+        if re.search(rb'/Encrypt\b', trailer):
+            raise PdfMergeError(f"{source} is encrypted")
+        root = self.find_ref(trailer, b'Root', source)
+        catalog, _ = self.read_object(data, xref, root, source)
+        pages = self.find_ref(catalog, b'Pages', source)
+
+        # Walk the first kids down to a page for the bookmark destination
+        pages_body, _ = self.read_object(data, xref, pages, source)
+        count = re.search(rb'/Count\s+(\d+)', pages_body)
+        first_page = node = pages
+        body = pages_body
+        for _ in range(64):
+            if re.search(rb'/Type\s*/Page(?![A-Za-z])', body):
+                first_page = node
+                break
+            kids = re.search(rb'/Kids\s*\[\s*(\d+)\s+\d+\s+R', body)
+            if kids is None:
+                break
+            node = int(kids.group(1))
+            body, _ = self.read_object(data, xref, node, source)
+
+        # Copy everything reachable from the page tree, numbering on discovery
+        mapping = {}
+        pending = collections.deque()
+
+        def number(old):
+            if old not in mapping:
+                mapping[old] = self.next_number
+                self.next_number += 1
+                pending.append(old)
+            return mapping[old]
+
+        def rewrite(body):
+            parts = []
+            for start, end, code in pdf_segments(body, 0):
+                chunk = body[start:end]
+                if code:
+                    chunk = PDF_REF.sub(lambda m: b'%d 0 R' % number(int(m.group(1))), chunk)
+                parts.append(chunk)
+            return b''.join(parts)
+
+        number(pages)
+        while pending:
+            old = pending.popleft()
+            try:
+                body, stream = self.read_object(data, xref, old, source)
+            except PdfMergeError:
+                # Dangling references resolve to null, as readers treat them
+                body, stream = b' null ', None
+            body = rewrite(body)
+            if old == pages:
+                body = body.replace(b'<<', b'<</Parent %d 0 R' % self.PAGES, 1)
+            self.offsets[mapping[old]] = self.out.tell()
+            self.out.write(b'%d 0 obj' % mapping[old])
+            self.out.write(body)
+            if stream is not None:
+                self.out.write(b'stream\n')
+                self.out.write(stream)
+                self.out.write(b'\nendstream\n')
+            self.out.write(b'endobj\n')
+
+        self.kids.append(mapping[pages])
+        self.bookmarks.append((title, mapping[first_page]))
+        self.page_count += int(count.group(1)) if count else 0
+
+    @staticmethod
+    def read_xref(data, source):
+        """Return ({object: offset}, newest trailer) following /Prev links"""
+        tail = data.rfind(b'startxref', max(0, len(data) - 2048))
+        match = PDF_STARTXREF.match(data, tail) if tail >= 0 else None
+        if match is None:
+            raise PdfMergeError(f"{source} has no cross-reference table")
+        offsets = {}
+        trailer = None
+        position = int(match.group(1))
+        seen = set()
+        while position is not None and position not in seen:
+            seen.add(position)
+            if data[position:position + 4] != b'xref':
+                raise PdfMergeError(f"{source} uses cross-reference streams, which can't be merged")
+            pos = position + 4
+            while True:
+                section = PDF_XREF_SECTION.match(data, pos)
+                if section is None:
+                    break
+                first, count = int(section.group(1)), int(section.group(2))
+                pos = section.end()
+                for number in range(first, first + count):
+                    entry = PDF_XREF_ENTRY.search(data, pos, pos + 40)
+                    if entry is None:
+                        raise PdfMergeError(f"{source} has a damaged cross-reference table")
+                    if entry.group(3) == b'n':
+                        offsets.setdefault(number, int(entry.group(1)))
+                    else:
+                        offsets.setdefault(number, None)
+                    pos = entry.end()
+            end = data.find(b'startxref', pos)
+            section_trailer = data[pos:end if end >= 0 else len(data)]
+            if b'/XRefStm' in section_trailer:
+                raise PdfMergeError(f"{source} uses cross-reference streams, which can't be merged")
+            if trailer is None:
+                trailer = section_trailer
+            prev = re.search(rb'/Prev\s+(\d+)', section_trailer)
+            position = int(prev.group(1)) if prev else None
+        return offsets, trailer
+
+    @staticmethod
+    def find_ref(body, key, source):
+        match = re.search(rb'/' + key + rb'\s+(\d+)\s+\d+\s+R', body)
+        if match is None:
+            raise PdfMergeError(f"{source} has no /{key.decode()} entry")
+        return int(match.group(1))
+
+    def read_object(self, data, xref, number, source):
+        """Return an object's body and its raw stream data (or None)"""
+        offset = xref.get(number)
+        header = PDF_OBJ.match(data, offset) if offset is not None else None
+        if header is None or int(header.group(1)) != number:
+            raise PdfMergeError(f"{source}: object {number} is missing")
+        start = header.end()
+        for seg_start, seg_end, code in pdf_segments(data, start):
+            keyword = PDF_OBJ_END.search(data, seg_start, seg_end) if code else None
+            if keyword is None:
+                continue
+            body = data[start:keyword.start()]
+            if keyword.group(1) == b'endobj':
+                return body, None
+            begin = keyword.end()
+            if data[begin:begin + 2] == b'\r\n':
+                begin += 2
+            elif data[begin:begin + 1] in (b'\r', b'\n'):
+                begin += 1
+            length = self.stream_length(data, xref, body, source)
+            if length is None or not PDF_ENDSTREAM.match(data, begin + length):
+                # Wrong or unresolved /Length: fall back to the end marker
+                length = data.find(b'endstream', begin) - begin
+                if length < 0:
+                    break
+                while length and data[begin + length - 1] in b'\r\n':
+                    length -= 1
+            return body, data[begin:begin + length]
+        raise PdfMergeError(f"{source}: object {number} is truncated")
+
+    def stream_length(self, data, xref, body, source):
+        match = re.search(rb'/Length\s+(\d+)(?:\s+\d+\s+R)?', body)
+        if match is None:
+            return None
+        if not match.group(0).endswith(b'R'):
+            return int(match.group(1))
+        try:
+            value, _ = self.read_object(data, xref, int(match.group(1)), source)
+        except PdfMergeError:
+            return None
+        value = value.strip()
+        return int(value) if value.isdigit() else None
+
+    def write_object(self, number, body):
+        self.offsets[number] = self.out.tell()
+        self.out.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+
+    def close(self):
+        """Write the page tree, outline and cross-reference table"""
+        items = list(range(self.next_number, self.next_number + len(self.bookmarks)))
+        self.next_number += len(items)
+        for i, (title, page) in enumerate(self.bookmarks):
+            links = b''
+            if i > 0:
+                links += b'/Prev %d 0 R' % items[i - 1]
+            if i + 1 < len(items):
+                links += b'/Next %d 0 R' % items[i + 1]
+            self.write_object(items[i], b'<</Title %s/Parent %d 0 R%s/Dest[%d 0 R/Fit]>>'
+                              % (pdf_text(title), self.OUTLINES, links, page))
+        outline = b'<</Type/Outlines/Count %d' % len(items)
+        if items:
+            outline += b'/First %d 0 R/Last %d 0 R' % (items[0], items[-1])
+        self.write_object(self.OUTLINES, outline + b'>>')
+        kids = b' '.join(b'%d 0 R' % kid for kid in self.kids)
+        self.write_object(self.PAGES, b'<</Type/Pages/Kids[%s]/Count %d>>' % (kids, self.page_count))
+        self.write_object(self.CATALOG, b'<</Type/Catalog/Pages %d 0 R/Outlines %d 0 R/PageMode/UseOutlines>>'
+                          % (self.PAGES, self.OUTLINES))
+
+        xref = self.out.tell()
+        self.out.write(b'xref\n0 %d\n0000000000 65535 f\r\n' % self.next_number)
+        for number in range(1, self.next_number):
+            self.out.write(b'%010d 00000 n\r\n' % self.offsets[number])
+        self.out.write(b'trailer\n<</Size %d/Root %d 0 R>>\nstartxref\n%d\n%%%%EOF\n'
+                       % (self.next_number, self.CATALOG, xref))
+        self.out.close()
+        os.replace(self.partial, self.path)
+
+    def abort(self):
+        """Discard a partially written merge"""
+        self.out.close()
+        try:
+            os.remove(self.partial)
+        except OSError:
+            pass
+
+
+class BatchMerger:
+    """Feed finished jobs to a PdfMerger in the order they were queued
+
+    Jobs finish out of order when several workers run, so results are held
+    back (just the job, not its PDF) until every earlier job has finished.
+    """
+
+    def __init__(self, path):
+        self.merger = PdfMerger(path)
+        self.lock = threading.Lock()
+        self.next_index = 0
+        self.waiting = {}
+        self.merged = 0
+        self.errors = []
+        self.closed = False
+
+    def add(self, job):
+        """Record a finished job and append any PDFs that are now in order"""
+        if job.state not in ('done', 'failed', 'cancelled'):
+            return
+        with self.lock:
+            if self.closed:
+                return
+            self.waiting[job.index] = job
+            while self.next_index in self.waiting:
+                self.append(self.waiting.pop(self.next_index))
+                self.next_index += 1
+
+    def append(self, job):
+        if job.state != 'done':
+            return
+        try:
+            self.merger.append(job.output, Path(job.path).stem)
+            self.merged += 1
+        except (OSError, PdfMergeError) as e:
+            self.errors.append((job.path, e))
+
+    def close(self):
+        """Append anything still held back and finish the merged PDF"""
+        with self.lock:
+            self.closed = True
+            for index in sorted(self.waiting):
+                self.append(self.waiting.pop(index))
+            if self.merged:
+                self.merger.close()
+            else:
+                self.merger.abort()
+        return self.merged
+
+    def abort(self):
+        """Drop the merge, removing the partial file; later jobs are ignored"""
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.merger.abort()
+
+
+def find_tool(name):
+    """Path of an optimization tool from OPTIMIZE_TOOLS, or None"""
+    for candidate in OPTIMIZE_TOOLS[name]:
+        path = shutil.which(candidate)
+        if path:
+            return path
+    return None
+
+
+def optimize_pdf(path, commands, timeout=None):
+    """Run each command over a PDF in turn, keeping the result only if smaller
+
+    ``commands`` are argument lists with '{input}' and '{output}'
+    placeholders. Intermediate files go to scratch space and the original
+    is only replaced, atomically, by a complete and smaller PDF.
+    Returns the (before, after) sizes.
+    """
+    before = os.path.getsize(path)
+    scratch = tempfile.mkdtemp(prefix='pdfconv-opt', dir=scratch_root())
+    try:
+        current = path
+        for step, command in enumerate(commands):
+            output = os.path.join(scratch, f'{step}.pdf')
+            argv = [current if arg == '{input}' else output if arg == '{output}' else arg
+                    for arg in command]
+            try:
+                result = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        text=True, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                raise ConversionTimeout(f"{os.path.basename(argv[0])} took longer than {timeout:.0f}s")
+            # qpdf exits with 3 when it succeeded with warnings
+            if result.returncode not in (0, 3) or not pdf_complete(output):
+                raise ConversionError(result.stderr.strip() or f"{os.path.basename(argv[0])} failed",
+                                      returncode=result.returncode, stderr=result.stderr)
+            current = output
+        after = os.path.getsize(current)
+        if after >= before:
+            return before, before
+        publish_file(current, path)
+        return before, after
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+class PdfOptimizer:
+    """Shrinks finished PDFs with one of the OPTIMIZE_PRESETS
+
+    Runs on a pool of its own, so optimizing one PDF overlaps with soffice
+    rendering the next documents. Each job gets ``optimized_size`` (or
+    ``optimize_error``, keeping the PDF as LibreOffice wrote it) and is
+    then passed to ``on_done`` from a pool thread; BatchScheduler does
+    this itself when given an optimizer. Steps whose tool isn't installed
+    are skipped and listed in ``missing``.
+    """
+
+    def __init__(self, preset, jobs=None, on_done=None, timeout=300):
+        self.preset = preset
+        self.on_done = on_done
+        self.timeout = timeout
+        self.commands = []
+        self.tools = []
+        self.missing = []
+        for tool, args in OPTIMIZE_PRESETS[preset]:
+            binary = find_tool(tool)
+            if binary is None:
+                self.missing.append(tool)
+            else:
+                self.commands.append([binary] + list(args))
+                self.tools.append(tool)
+        # Each task mostly waits on a gs/qpdf process, so threads suffice;
+        # imported here so runs that don't optimize never load it
+        import concurrent.futures
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs or default_jobs())
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.optimized = 0
+        self.before = 0
+        self.after = 0
+
+    @property
+    def usable(self):
+        """Whether any step of the preset can run"""
+        return bool(self.commands)
+
+    @property
+    def variant(self):
+        """Cache variant for the preset and the steps that actually run
+
+        A preset run while gs was missing is cached apart from the full one,
+        so installing gs later makes its PDFs get optimized properly.
+        """
+        return '+'.join([self.preset] + self.tools)
+
+    def submit(self, job, on_done=None):
+        """Queue a converted job's PDF; ``on_done`` overrides the default callback"""
+        future = self.executor.submit(self.optimize, job, on_done or self.on_done)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self.discard)
+
+    def discard(self, future):
+        with self.lock:
+            self.pending.discard(future)
+
+    def optimize(self, job, on_done=None):
+        try:
+            before, after = optimize_pdf(job.output, self.commands, self.timeout)
+            job.optimized_size = after
+            with self.lock:
+                self.optimized += 1
+                self.before += before
+                self.after += after
+        except (ConversionError, OSError) as e:
+            job.optimize_error = str(e)
+        if on_done is not None:
+            on_done(job)
+
+    def summary(self):
+        """One line with the total size change"""
+        if not self.before:
+            return f"{self.optimized} PDFs"
+        saved = 100 * (self.before - self.after) / self.before
+        return (f"{self.optimized} PDFs, {format_size(self.before)} -> "
+                f"{format_size(self.after)} ({saved:.0f}% smaller)")
+
+    def close(self, cancel=False):
+        """Wait for queued PDFs, or with ``cancel`` drop those not yet started"""
+        if cancel:
+            with self.lock:
+                pending = list(self.pending)
+            for future in pending:
+                future.cancel()
+        self.executor.shutdown(wait=True)
+
+
+class Inotify:
+    """Minimal ctypes binding to Linux inotify"""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, libc, fd):
+        self.libc = libc
+        self.fd = fd
+        # watch descriptor -> directory
+        self.folders = {}
+
+    @classmethod
+    def create(cls):
+        """Return an Inotify instance, or None where inotify is unavailable"""
+        if not sys.platform.startswith('linux'):
+            return None
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    def watch(self, folder):
+        """Watch one directory (not recursive); False if that failed"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), self.MASK)
+        if wd < 0:
+            return False
+        self.folders[wd] = folder
+        return True
+
+    def read(self, timeout):
+        """Wait up to timeout seconds; return [(path, is_dir)] or None on overflow"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if mask & self.IN_IGNORED:
+                self.folders.pop(wd, None)
+            elif wd in self.folders and name:
+                events.append((os.path.join(self.folders[wd], name), bool(mask & self.IN_ISDIR)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def signature(path):
+    """(size, mtime_ns) of a file, or None if it has gone"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class FolderWatcher:
+    """Reports new or modified Office documents below a folder
+
+    Uses inotify on Linux and falls back to periodic scandir snapshots
+    elsewhere. A file is only reported once its size and mtime have been
+    unchanged for ``settle`` seconds, so documents still being copied are
+    left alone. What has been converted is persisted in ``state_path``,
+    and the scan at startup stats every file against it, so after a
+    restart only files that are new or were modified in the meantime
+    (including ones overwritten in place) are reported.
+    """
+
+    def __init__(self, root, state_path, settle=2.0, poll_interval=5.0):
+        self.root = os.path.abspath(root)
+        self.state_path = state_path
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.dirty = False
+        # path -> signature of the version last converted / last failed
+        self.converted = {}
+        self.failed = {}
+        # path -> (signature, monotonic time it was last seen changing)
+        self.pending = {}
+        self.load()
+        self.inotify = Inotify.create()
+        self.last_scan = time.monotonic()
+        self.scan()
+
+    def load(self):
+        """Read the persisted state index"""
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.converted = state.get('converted', {})
+        self.failed = state.get('failed', {})
+
+    def save(self):
+        """Write the state index if anything changed"""
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps({'root': self.root, 'converted': self.converted,
+                               'failed': self.failed})
+            self.dirty = False
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, self.state_path)
+
+    def scan(self, folder=None):
+        """Walk a tree, queueing documents that differ from the index
+
+        Every document is stat'ed: a folder's mtime can't be trusted to
+        skip them, since overwriting a file in place leaves it unchanged,
+        and one stat is cheap next to a conversion.
+        """
+        stack = [folder or self.root]
+        while stack:
+            current = stack.pop()
+            if self.inotify is not None:
+                self.inotify.watch(current)
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith(OFFICE_EXTENSIONS):
+                        self.consider(entry.path)
+                except OSError:
+                    continue
+
+    def consider(self, path):
+        """Start the settle timer for a possibly new or changed file"""
+        sig = signature(path)
+        if sig is None or path in self.pending:
+            return
+        with self.lock:
+            if self.converted.get(path) == sig or self.failed.get(path) == sig:
+                return
+        self.pending[path] = (sig, time.monotonic())
+
+    def poll(self, timeout=0.5):
+        """Wait for changes; return [(path, signature)] of files ready to convert"""
+        if self.inotify is not None:
+            events = self.inotify.read(timeout)
+            if events is None:
+                # Event queue overflowed; fall back to a full pass
+                self.scan()
+            for path, is_dir in events or ():
+                if is_dir:
+                    self.scan(path)
+                elif path.lower().endswith(OFFICE_EXTENSIONS):
+                    self.pending.pop(path, None)
+                    self.consider(path)
+        else:
+            time.sleep(timeout)
+            if time.monotonic() - self.last_scan >= self.poll_interval:
+                self.last_scan = time.monotonic()
+                self.scan()
+        return self.settled()
+
+    def settled(self):
+        """Pop pending files whose size and mtime stopped changing"""
+        now = time.monotonic()
+        ready = []
+        for path, (sig, since) in list(self.pending.items()):
+            current = signature(path)
+            if current is None:
+                del self.pending[path]
+            elif current != sig:
+                self.pending[path] = (current, now)
+            elif now - since >= self.settle:
+                del self.pending[path]
+                ready.append((path, sig))
+        return ready
+
+    def record(self, path, sig, ok):
+        """Remember the outcome of converting one version of a file"""
+        with self.lock:
+            if ok:
+                self.converted[path] = sig
+                self.failed.pop(path, None)
+            else:
+                self.failed[path] = sig
+            self.dirty = True
+
+    def close(self):
+        """Stop watching and persist the index"""
+        if self.inotify is not None:
+            self.inotify.close()
+        self.save()
+
+
+def watch_state_path(root, output_dir):
+    """State index file for one watched folder / output folder pair"""
+    key = hashlib.sha1(f"{os.path.abspath(root)}\0{os.path.abspath(output_dir)}".encode()).hexdigest()
+    return os.path.join(user_cache_dir(), 'watch', key[:16] + '.json')
+
+
+def output_names_path(output_dir):
+    """Persisted OutputNames claims for one watched output folder"""
+    key = hashlib.sha1(os.path.abspath(output_dir).encode()).hexdigest()
+    return os.path.join(user_cache_dir(), 'watch', key[:16] + '-names.json')
+
+
+def cli_cache(args, binary):
+    """The ConversionCache requested on the command line, or None"""
+    if args.no_cache:
+        return None
+    return ConversionCache(args.cache_dir, max_bytes=args.cache_size * 1024 ** 2,
+                           version=libreoffice_version(binary))
+
+
+def run_watch(args):
+    """Convert new and modified documents below the input folders until interrupted"""
+    lock = threading.Lock()
+
+    def report(job):
+        if job.state not in ('done', 'failed'):
+            return
+        watcher, sig = job.tag
+        watcher.record(job.path, sig, job.state == 'done')
+        with lock:
+            print(json.dumps(job_record(job)), flush=True)
+
+    binary = args.soffice or find_soffice() or 'libreoffice'
+    os.makedirs(args.outdir, exist_ok=True)
+    pool = WorkerPool(binary, size=args.jobs, timeout=args.timeout or 60)
+    model = ThroughputModel()
+    cache = cli_cache(args, binary)
+    # PDF name claims outlive restarts so x.odt can't overwrite x.docx's x.pdf
+    names = OutputNames(args.outdir, output_names_path(args.outdir))
+    scheduler = BatchScheduler(pool, args.outdir, on_update=report, cache=cache, model=model,
+                               timeout=args.timeout, largest_first=args.order == 'largest',
+                               retain=False, batch_size=args.batch_size, names=names)
+    watchers = [FolderWatcher(root, watch_state_path(root, args.outdir), settle=args.settle)
+                for root in args.inputs]
+
+    # Stop cleanly on Ctrl+C or a service manager's SIGTERM
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *a: stop.set())
+
+    scheduler.start()
+    last_save = time.monotonic()
+    try:
+        while not stop.is_set():
+            for watcher in watchers:
+                for path, sig in watcher.poll(timeout=0.5 / len(watchers)):
+                    scheduler.submit(path, tag=(watcher, sig))
+            if time.monotonic() - last_save > 5:
+                last_save = time.monotonic()
+                for watcher in watchers:
+                    watcher.save()
+                names.save()
+                model.save()
+                if cache is not None:
+                    cache.save()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.close()
+        scheduler.wait()
+        for watcher in watchers:
+            watcher.close()
+        names.save()
+        model.save()
+        if cache is not None:
+            cache.save()
+        pool.shutdown()
+    return 0
+
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+                405: 'Method Not Allowed', 411: 'Length Required', 413: 'Payload Too Large',
+                422: 'Unprocessable Entity', 429: 'Too Many Requests', 500: 'Internal Server Error',
+                503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+class ConversionService:
+    """Local HTTP front end that shares one worker pool between all clients
+
+    POST /convert?name=report.docx   convert the uploaded request body
+    POST /convert?path=/abs/file     convert a local file (with --allow-paths)
+    GET  /queue                      queue depth and capacity
+    GET  /health                     per-worker status
+
+    The PDF is streamed back in the response. When ``max_queue`` documents
+    are already waiting, new requests get 429 with a Retry-After estimated
+    from the queue's ETA, before any upload is read.
+    """
+
+    CHUNK = 64 * 1024
+
+    def __init__(self, scheduler, max_queue=64, max_upload=200 * 1024 ** 2, allow_paths=False):
+        self.scheduler = scheduler
+        self.max_queue = max_queue
+        self.max_upload = max_upload
+        self.allow_paths = allow_paths
+        self.loop = None
+        # Slots held by requests still uploading, so bursts can't overfill the queue
+        self.reserved = 0
+        self.stopping = False
+        self.requests = set()
+        self.served = collections.Counter()
+        scheduler.on_update = self.on_update
+
+    def on_update(self, job):
+        """Wake the request waiting on a finished job (called from worker threads)"""
+        if job.state in ('done', 'failed', 'cancelled'):
+            try:
+                self.loop.call_soon_threadsafe(self.finish, job)
+            except RuntimeError:
+                # The loop has closed after shutdown; nobody is waiting any more
+                pass
+
+    @staticmethod
+    def finish(job):
+        if not job.tag.done():
+            job.tag.set_result(job)
+
+    def depth(self):
+        """Documents waiting for a worker, including uploads in progress"""
+        return len(self.scheduler.jobs) + self.reserved
+
+    def retry_after(self):
+        """Seconds a rejected client should wait before trying again"""
+        eta = self.scheduler.eta() or 1
+        return max(1, min(300, int(eta + 0.999)))
+
+    def available(self):
+        """True while the service accepts work"""
+        return not self.stopping and any(t.is_alive() for t in self.scheduler.threads)
+
+    async def serve(self, host, port, grace=30):
+        """Accept connections until stop() is called"""
+        # Only --serve needs asyncio, which is slow to import
+        import asyncio
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        server = await asyncio.start_server(self.handle, host, port)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+        addresses = ", ".join(str(sock.getsockname()[:2]) for sock in server.sockets)
+        print(f"Serving on {addresses}", file=sys.stderr, flush=True)
+        async with server:
+            await self.stopped.wait()
+            # Stop accepting, then give requests already queued a chance to finish
+            server.close()
+            if self.requests:
+                await asyncio.wait(self.requests, timeout=grace)
+
+    def stop(self):
+        self.stopping = True
+        self.stopped.set()
+
+    async def handle(self, reader, writer):
+        """Serve one request per connection"""
+        import asyncio
+        task = asyncio.current_task()
+        self.requests.add(task)
+        try:
+            request = await reader.readline()
+            parts = request.decode('latin-1').split()
+            if len(parts) != 3:
+                return await self.respond(writer, 400, {'error': 'malformed request line'})
+            method, target, _ = parts
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            url = urllib.parse.urlsplit(target)
+            query = dict(urllib.parse.parse_qsl(url.query))
+
+            if url.path == '/health':
+                await self.health(writer)
+            elif url.path == '/queue':
+                await self.respond(writer, 200, self.queue_status())
+            elif url.path == '/convert':
+                if method != 'POST':
+                    return await self.respond(writer, 405, {'error': 'use POST'})
+                await self.convert(reader, writer, headers, query)
+            else:
+                await self.respond(writer, 404, {'error': 'not found'})
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self.requests.discard(task)
+            writer.close()
+
+    def queue_status(self):
+        """Queue depth, in-flight count and capacity"""
+        return {'queued': self.depth(), 'running': self.scheduler.jobs.active,
+                'capacity': self.max_queue, 'workers': len(self.scheduler.pool.workers),
+                'eta_s': round(self.scheduler.eta() or 0, 1), 'served': dict(self.served)}
+
+    async def health(self, writer):
+        """Report each worker's soffice state"""
+        workers = [{'id': w.worker_id, 'status': w.status(), 'converted': w.converted}
+                   for w in self.scheduler.pool.workers]
+        ok = self.available()
+        await self.respond(writer, 200 if ok else 503,
+                           {'status': 'ok' if ok else 'unavailable', 'workers': workers})
+
+    async def convert(self, reader, writer, headers, query):
+        """Queue an uploaded or local document and stream back its PDF"""
+        import asyncio
+        if not self.available():
+            return await self.respond(writer, 503, {'error': 'shutting down'},
+                                      {'Retry-After': str(self.retry_after())})
+        if self.depth() >= self.max_queue:
+            self.served['rejected'] += 1
+            return await self.respond(writer, 429, {'error': 'queue full', 'queued': self.depth()},
+                                      {'Retry-After': str(self.retry_after())})
+
+        workdir = tempfile.mkdtemp(prefix="pdfconv-http-")
+        try:
+            if 'path' in query:
+                if not self.allow_paths:
+                    return await self.respond(writer, 403, {'error': 'path conversion is disabled'})
+                source = query['path']
+                if not os.path.isfile(source):
+                    return await self.respond(writer, 404, {'error': 'no such file'})
+            else:
+                name = os.path.basename(query.get('name') or headers.get('x-filename', ''))
+                if not name.lower().endswith(OFFICE_EXTENSIONS):
+                    return await self.respond(writer, 422, {'error': 'pass ?name= with an Office file name'})
+                if not headers.get('content-length', '').isdigit():
+                    return await self.respond(writer, 411, {'error': 'Content-Length required'})
+                length = int(headers['content-length'])
+                if length > self.max_upload:
+                    return await self.respond(writer, 413, {'error': 'upload too large'})
+                source = os.path.join(workdir, name)
+                self.reserved += 1
+                try:
+                    await self.receive(reader, source, length)
+                finally:
+                    self.reserved -= 1
+
+            done = self.loop.create_future()
+            job = self.scheduler.submit(source, output_dir=workdir, tag=done)
+            # Responses close the connection, so the client sends nothing more:
+            # end of input means it has gone and its job shouldn't hold a queue slot
+            gone = asyncio.ensure_future(self.disconnected(reader))
+            await asyncio.wait({done, gone}, return_when=asyncio.FIRST_COMPLETED)
+            gone.cancel()
+            if not done.done() and self.scheduler.withdraw(job):
+                self.served['abandoned'] += 1
+                return
+            # A job already converting is left to finish before workdir goes
+            job = await done
+
+            if job.state == 'cancelled':
+                return await self.respond(writer, 503, {'error': 'shutting down'})
+            if job.state != 'done':
+                self.served['failed'] += 1
+                status = 504 if isinstance(job.error, ConversionTimeout) else 500
+                return await self.respond(writer, status, job_record(job))
+            self.served['converted'] += 1
+            await self.send_file(writer, job.output, Path(source).stem + '.pdf')
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    async def disconnected(self, reader):
+        """Return once the client has closed the connection"""
+        try:
+            while await reader.read(self.CHUNK):
+                pass
+        except ConnectionError:
+            pass
+
+    async def receive(self, reader, path, length):
+        """Copy a request body to disk without holding it in memory"""
+        import asyncio
+        with open(path, 'wb') as f:
+            remaining = length
+            while remaining:
+                chunk = await reader.read(min(self.CHUNK, remaining))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b'', remaining)
+                f.write(chunk)
+                remaining -= len(chunk)
+
+    async def send_file(self, writer, path, filename):
+        """Stream a PDF back in chunks"""
+        size = os.path.getsize(path)
+        self.write_head(writer, 200, {'Content-Type': 'application/pdf',
+                                      'Content-Length': str(size),
+                                      'Content-Disposition': f'attachment; filename="{filename}"'})
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK), b''):
+                writer.write(chunk)
+                await writer.drain()
+
+    @staticmethod
+    def write_head(writer, status, headers):
+        lines = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}", 'Connection: close']
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+    async def respond(self, writer, status, payload, headers=None):
+        """Send a JSON response"""
+        body = json.dumps(payload).encode()
+        self.write_head(writer, status, dict(headers or {}, **{
+            'Content-Type': 'application/json', 'Content-Length': str(len(body))}))
+        writer.write(body)
+        await writer.drain()
+
+
+def run_serve(args):
+    """Run the local HTTP conversion service until interrupted"""
+    import asyncio
+
+    binary = args.soffice or find_soffice() or 'libreoffice'
+    pool = WorkerPool(binary, size=args.jobs, timeout=args.timeout or 60)
+    model = ThroughputModel()
+    cache = cli_cache(args, binary)
+    scheduler = BatchScheduler(pool, tempfile.gettempdir(), cache=cache, model=model,
+                               timeout=args.timeout, largest_first=args.order == 'largest',
+                               retain=False, batch_size=args.batch_size)
+    service = ConversionService(scheduler, max_queue=args.max_queue,
+                                max_upload=args.max_upload * 1024 ** 2,
+                                allow_paths=args.allow_paths)
+    scheduler.start()
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Requests still waiting after the grace period have given up; their
+        # jobs are dropped rather than converted for nobody
+        scheduler.cancel()
+        scheduler.wait()
+        model.save()
+        if cache is not None:
+            cache.save()
+        pool.shutdown()
+    return 0
+
+
+def run_cli(args):
+    """Convert the given inputs, streaming one JSON line per file to stdout"""
+    lock = threading.Lock()
+    merger = BatchMerger(args.merge) if args.merge else None
+    finished = collections.Counter()
+
+    def report(job):
+        if job.state in ('done', 'failed'):
+            with lock:
+                finished[job.state] += 1
+                print(json.dumps(job_record(job)), flush=True)
+            if merger is not None:
+                merger.add(job)
+
+    # Converted PDFs are optimized while soffice carries on with the batch
+    optimizer = None
+    if args.optimize:
+        optimizer = PdfOptimizer(args.optimize)
+        if optimizer.missing:
+            print(f"optimize: {', '.join(optimizer.missing)} not found, skipping those steps",
+                  file=sys.stderr)
+        if not optimizer.usable:
+            optimizer.close()
+            optimizer = None
+
+    binary = args.soffice or find_soffice() or 'libreoffice'
+    cache = cli_cache(args, binary)
+    model = ThroughputModel()
+    try:
+        jobs = convert(expand_inputs(args.inputs), args.outdir, jobs=args.jobs, binary=binary,
+                       on_update=report, cache=cache, model=model, timeout=args.timeout,
+                       largest_first=args.order == 'largest', batch_size=args.batch_size,
+                       optimizer=optimizer)
+    except KeyboardInterrupt:
+        # convert() has cancelled the batch; keep finished PDFs, drop the merge
+        if optimizer is not None:
+            optimizer.close(cancel=True)
+        if merger is not None:
+            merger.abort()
+        with lock:
+            print(f"cancelled: {finished['done']} converted, {finished['failed']} failed",
+                  file=sys.stderr)
+        return 130
+    if optimizer is not None:
+        print(f"optimize: {optimizer.summary()}", file=sys.stderr)
+    if cache is not None:
+        print(f"cache: {cache.hits} hits, {cache.misses} misses", file=sys.stderr)
+    if merger is not None:
+        merged = merger.close()
+        for path, error in merger.errors:
+            print(f"merge: skipped {path}: {error}", file=sys.stderr)
+        print(f"merge: {merged} files into {args.merge}", file=sys.stderr)
+    if args.run_log:
+        write_run_log(jobs, args.run_log)
+    if args.metrics:
+        with open(args.metrics, 'w') as f:
+            f.write(prometheus_metrics(jobs, cache))
+    if args.trace:
+        write_chrome_trace(jobs, args.trace)
+    return 0 if all(job.state == 'done' for job in jobs) else 1
+
+
+# Row states in the file list, stored one byte per file
+QUEUED, RUNNING, DONE, FAILED = range(4)
+STATE_ICONS = ("📄", "⏳", "✅", "❌")
+
+
+class VirtualFileList:
+    """Scrollable file list that only draws the rows currently visible
+
+    The list holds no per-row widgets or strings: ``count`` returns the
+    number of rows and ``row_text(index)`` renders one on demand, so the
+    cost of a redraw depends on the window height, not the queue length.
+    """
+
+    def __init__(self, parent, count, row_text, bg, fg, select_bg, font=('Monospace', 10)):
+        self.count = count
+        self.row_text = row_text
+        self.fg = fg
+        self.select_bg = select_bg
+        self.font = tk.font.Font(font=font)
+        self.row_height = self.font.metrics('linespace') + 4
+        self.top = 0
+        self.selection = set()
+        self.anchor = None
+
+        self.canvas = tk.Canvas(parent, bg=bg, highlightthickness=0, relief=tk.FLAT, borderwidth=2)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = tk.Scrollbar(parent, command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.canvas.bind("<Configure>", lambda e: self.refresh())
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<Shift-Button-1>", lambda e: self.on_click(e, extend=True))
+        self.canvas.bind("<Control-Button-1>", lambda e: self.on_click(e, toggle=True))
+        self.canvas.bind("<MouseWheel>", lambda e: self.yview('scroll', -1 if e.delta > 0 else 1, 'units'))
+        self.canvas.bind("<Button-4>", lambda e: self.yview('scroll', -1, 'units'))
+        self.canvas.bind("<Button-5>", lambda e: self.yview('scroll', 1, 'units'))
+
+    def visible_rows(self):
+        """Number of rows that fit in the canvas"""
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def yview(self, *args):
+        """Scrollbar protocol: 'moveto fraction' or 'scroll n units|pages'"""
+        total = self.count()
+        visible = self.visible_rows()
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * total)
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self.top += step * visible if args[2] == 'pages' else step * 3
+        self.refresh()
+
+    def on_click(self, event, extend=False, toggle=False):
+        """Select rows like a listbox with extended selection"""
+        index = self.top + event.y // self.row_height
+        if index >= self.count():
+            return
+        if extend and self.anchor is not None:
+            low, high = sorted((self.anchor, index))
+            self.selection.update(range(low, high + 1))
+        elif toggle:
+            self.selection.symmetric_difference_update({index})
+            self.anchor = index
+        else:
+            self.selection = {index}
+            self.anchor = index
+        self.refresh()
+
+    def curselection(self):
+        """Selected row indexes in ascending order"""
+        return sorted(self.selection)
+
+    def clear_selection(self):
+        """Forget the current selection"""
+        self.selection.clear()
+        self.anchor = None
+
+    def refresh(self):
+        """Redraw the visible slice of the list and sync the scrollbar"""
+        total = self.count()
+        visible = self.visible_rows()
+        self.top = max(0, min(self.top, total - visible))
+        width = self.canvas.winfo_width()
+
+        self.canvas.delete('all')
+        for index in range(self.top, min(total, self.top + visible + 1)):
+            y = (index - self.top) * self.row_height
+            if index in self.selection:
+                self.canvas.create_rectangle(0, y, width, y + self.row_height,
+                                             fill=self.select_bg, width=0)
+            self.canvas.create_text(6, y + 2, text=self.row_text(index), anchor='nw',
+                                    fill=self.fg, font=self.font)
+
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+
+class ErrorPanel:
+    """Non-modal window listing the failures in an ErrorStore
+
+    The window only reads the store when refresh() is called, so worker
+    threads never wait on it and closing it loses nothing. Rows can be
+    filtered by text and exported as CSV or JSON.
+    """
+
+    def __init__(self, root, errors, create_button, bg, fg, btn_color):
+        self.errors = errors
+        self.shown = []
+        self.shown_filter = None
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Conversion Errors")
+        self.window.geometry("640x460")
+        self.window.configure(bg=bg)
+        self.window.grid_columnconfigure(0, weight=1)
+        self.window.grid_rowconfigure(1, weight=3)
+        self.window.grid_rowconfigure(2, weight=2)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        # Filter box, row count and export buttons
+        top = tk.Frame(self.window, bg=bg)
+        top.grid(row=0, column=0, sticky="ew", padx=10, pady=(10, 5))
+        top.grid_columnconfigure(1, weight=1)
+        tk.Label(top, text="Filter:", bg=bg, fg=fg, font=('Arial', 10)).grid(row=0, column=0)
+        self.filter = tk.StringVar()
+        self.filter.trace_add('write', lambda *args: self.refresh())
+        filter_entry = tk.Entry(top, textvariable=self.filter, bg='#3c3c3c', fg=fg,
+                                insertbackground=fg, relief=tk.FLAT, font=('Arial', 10))
+        filter_entry.grid(row=0, column=1, sticky="ew", padx=(5, 10))
+        self.count_label = tk.Label(top, bg=bg, fg='#aaaaaa', font=('Arial', 10))
+        self.count_label.grid(row=0, column=2, padx=(0, 10))
+        create_button(top, "💾 CSV", lambda: self.export('.csv'), btn_color, fg).grid(row=0, column=3, padx=(0, 5))
+        create_button(top, "💾 JSON", lambda: self.export('.json'), btn_color, fg).grid(row=0, column=4)
+
+        # One row per failure
+        list_frame = tk.Frame(self.window, bg=bg)
+        list_frame.grid(row=1, column=0, sticky="nsew", padx=10)
+        list_frame.grid_rowconfigure(0, weight=1)
+        list_frame.grid_columnconfigure(0, weight=1)
+        self.listbox = tk.Listbox(list_frame, bg='#3c3c3c', fg=fg, selectbackground=btn_color,
+                                  relief=tk.FLAT, activestyle='none', font=('Monospace', 10))
+        self.listbox.grid(row=0, column=0, sticky="nsew")
+        list_scroll = tk.Scrollbar(list_frame, command=self.listbox.yview)
+        list_scroll.grid(row=0, column=1, sticky="ns")
+        self.listbox.config(yscrollcommand=list_scroll.set)
+        self.listbox.bind("<<ListboxSelect>>", lambda e: self.show_details())
+
+        # Full error output of the selected failure
+        detail_frame = tk.Frame(self.window, bg=bg)
+        detail_frame.grid(row=2, column=0, sticky="nsew", padx=10, pady=10)
+        detail_frame.grid_rowconfigure(0, weight=1)
+        detail_frame.grid_columnconfigure(0, weight=1)
+        self.details = tk.Text(detail_frame, bg='#1e1e1e', fg=fg, relief=tk.FLAT, wrap='word',
+                               height=8, font=('Monospace', 9), state='disabled')
+        self.details.grid(row=0, column=0, sticky="nsew")
+        detail_scroll = tk.Scrollbar(detail_frame, command=self.details.yview)
+        detail_scroll.grid(row=0, column=1, sticky="ns")
+        self.details.config(yscrollcommand=detail_scroll.set)
+
+        self.refresh()
+
+    @property
+    def is_open(self):
+        return self.window is not None
+
+    def row_text(self, entry):
+        """One-line summary of a failure"""
+        if entry['timeout']:
+            reason = "timed out"
+        elif entry['returncode'] is not None:
+            reason = f"exit {entry['returncode']}"
+        else:
+            reason = "failed"
+        first_line = entry['error'].splitlines()[0] if entry['error'] else ""
+        return f"{os.path.basename(entry['path'])} • {reason} • {first_line}"
+
+    def refresh(self):
+        """Show the failures matching the filter, appending when only new ones arrived"""
+        if self.window is None:
+            return
+        text = self.filter.get()
+        entries = self.errors.matching(text)
+        if text != self.shown_filter or len(entries) < len(self.shown):
+            self.listbox.delete(0, tk.END)
+            self.shown = []
+            self.shown_filter = text
+        new = entries[len(self.shown):]
+        if new:
+            self.listbox.insert(tk.END, *(self.row_text(entry) for entry in new))
+            self.shown.extend(new)
+        self.count_label.config(text=f"{len(self.shown)} of {len(self.errors)}")
+
+    def show_details(self):
+        """Put the selected failure's full error and stderr in the detail box"""
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        entry = self.shown[selection[0]]
+        lines = [entry['path'],
+                 f"Exit code: {entry['returncode']}   Timed out: {'yes' if entry['timeout'] else 'no'}"
+                 f"   Duration: {entry['duration_s']}s   Attempts: {entry['attempts']}",
+                 "", entry['error']]
+        if entry['stderr'] and entry['stderr'] != entry['error']:
+            lines += ["", "stderr:", entry['stderr']]
+        self.details.config(state='normal')
+        self.details.delete('1.0', tk.END)
+        self.details.insert('1.0', "\n".join(lines))
+        self.details.config(state='disabled')
+
+    def export(self, extension):
+        """Save the rows currently shown"""
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(parent=self.window, defaultextension=extension,
+                                            initialfile="conversion-errors" + extension,
+                                            filetypes=[(extension[1:].upper(), "*" + extension)])
+        if not path:
+            return
+        try:
+            self.errors.export(path, self.shown)
+        except OSError as e:
+            messagebox.showerror("Export Failed", str(e), parent=self.window)
+
+    def lift(self):
+        self.window.deiconify()
+        self.window.lift()
+
+    def close(self):
+        self.window.destroy()
+        self.window = None
+
 
 class LibreOfficePDFConverter:
     def __init__(self, root):
@@ -28,13 +3365,45 @@ class LibreOfficePDFConverter:
         
         # Variables
         self.files_to_convert = []
+        self.file_states = bytearray()
+        self.queued_paths = set()
+        self.discovering = 0
+        self.scheduler = None
+        self.pool = None
+        self.cache = None
+        self.model = None
+        self.binary = None
+        self.prewarm_thread = None
+        self.refresh_lock = threading.Lock()
+        self.refresh_pending = False
+        self.pending_status = None
+        # Failures are collected here and shown in an ErrorPanel, never one popup each
+        self.errors = ErrorStore()
+        self.error_panel = None
+        self.shown_errors = 0
+        self.jobs_var = tk.IntVar(value=default_jobs())
+        self.largest_first = tk.BooleanVar(value=True)
+        self.merge = tk.BooleanVar(value=False)
+        self.optimize = tk.StringVar(value="Off")
+        self.optimizer = None
+        # (output folder, optimize preset) of the last batch; converted rows
+        # are only kept when the next batch uses the same
+        self.last_settings = None
+        # Thread stopping the workers once the window is closed
+        self.closing = None
+        # Row index -> (size as rendered, size after optimizing)
+        self.sizes = {}
         self.output_dir = tk.StringVar(value=os.path.expanduser("~/Desktop"))
         
         # Create GUI with proper layout management
         self.create_widgets(bg_color, fg_color, btn_color, accent_color)
+        self.colors = (bg_color, fg_color, btn_color)
         
-        # Check for LibreOffice
-        self.check_libreoffice()
+        # Check for LibreOffice, then start soffice while the window draws
+        if self.check_libreoffice():
+            self.pool = WorkerPool(self.binary, size=self.jobs_var.get())
+            self.prewarm_thread = threading.Thread(target=self.prewarm, daemon=True)
+            self.prewarm_thread.start()
         
         # Configure grid weights for proper stretching
         self.configure_grid()
@@ -130,6 +3499,69 @@ class LibreOfficePDFConverter:
                               font=('Arial', 9))
         browse_btn.grid(row=0, column=1, sticky="e")
         
+        # Number of LibreOffice workers converting in parallel
+        jobs_frame = tk.Frame(output_frame, bg=bg_color)
+        jobs_frame.grid(row=2, column=0, pady=(10, 0), sticky="w")
+        
+        tk.Label(jobs_frame,
+                text="Parallel conversions:",
+                bg=bg_color,
+                fg=fg_color,
+                font=('Arial', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.jobs_spinbox = tk.Spinbox(jobs_frame,
+                                      from_=1,
+                                      to=max(64, default_jobs()),
+                                      textvariable=self.jobs_var,
+                                      width=4,
+                                      bg='#3c3c3c',
+                                      fg=fg_color,
+                                      buttonbackground='#555555',
+                                      relief=tk.FLAT,
+                                      font=('Arial', 10))
+        self.jobs_spinbox.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Longest-processing-time-first ordering shortens the batch
+        tk.Checkbutton(jobs_frame,
+                      text="Largest files first",
+                      variable=self.largest_first,
+                      bg=bg_color,
+                      fg=fg_color,
+                      selectcolor='#3c3c3c',
+                      activebackground=bg_color,
+                      activeforeground=fg_color,
+                      font=('Arial', 10)).pack(side=tk.LEFT, padx=(20, 0))
+        
+        tk.Checkbutton(jobs_frame,
+                      text="Merge into one PDF",
+                      variable=self.merge,
+                      bg=bg_color,
+                      fg=fg_color,
+                      selectcolor='#3c3c3c',
+                      activebackground=bg_color,
+                      activeforeground=fg_color,
+                      font=('Arial', 10)).pack(side=tk.LEFT, padx=(20, 0))
+        
+        # Optional post-processing of each PDF, overlapping the conversions
+        optimize_frame = tk.Frame(output_frame, bg=bg_color)
+        optimize_frame.grid(row=3, column=0, pady=(10, 0), sticky="w")
+        
+        tk.Label(optimize_frame,
+                text="Optimize PDFs:",
+                bg=bg_color,
+                fg=fg_color,
+                font=('Arial', 10, 'bold')).pack(side=tk.LEFT)
+        
+        optimize_menu = tk.OptionMenu(optimize_frame, self.optimize, "Off", *OPTIMIZE_PRESETS)
+        optimize_menu.config(bg='#3c3c3c',
+                             fg=fg_color,
+                             activebackground='#555555',
+                             activeforeground=fg_color,
+                             highlightthickness=0,
+                             relief=tk.FLAT,
+                             font=('Arial', 10))
+        optimize_menu.pack(side=tk.LEFT, padx=(10, 0))
+        
         # Files to Convert Label
         tk.Label(main_frame, 
                 text="Files to Convert:", 
@@ -144,22 +3576,13 @@ class LibreOfficePDFConverter:
         list_container.grid_rowconfigure(0, weight=1)
         list_container.grid_columnconfigure(0, weight=1)
         
-        # Scrollbar for listbox
-        scrollbar = tk.Scrollbar(list_container)
-        scrollbar.grid(row=0, column=1, sticky="ns")
-        
-        # File listbox
-        self.file_listbox = tk.Listbox(list_container,
-                                      bg='#3c3c3c',
-                                      fg=fg_color,
-                                      selectbackground=btn_color,
-                                      selectforeground=fg_color,
-                                      font=('Monospace', 10),
-                                      relief=tk.FLAT,
-                                      borderwidth=2,
-                                      yscrollcommand=scrollbar.set)
-        self.file_listbox.grid(row=0, column=0, sticky="nsew")
-        scrollbar.config(command=self.file_listbox.yview)
+        # File list (only the visible rows are drawn)
+        self.file_list = VirtualFileList(list_container,
+                                         count=lambda: len(self.files_to_convert),
+                                         row_text=self.row_text,
+                                         bg='#3c3c3c',
+                                         fg=fg_color,
+                                         select_bg=btn_color)
         row += 1
         
         # File Management Buttons - CENTERED
@@ -169,23 +3592,29 @@ class LibreOfficePDFConverter:
         
         # Center the buttons in the frame
         file_btn_frame.grid_columnconfigure(0, weight=1)
-        file_btn_frame.grid_columnconfigure(4, weight=1)
+        file_btn_frame.grid_columnconfigure(6, weight=1)
         
         # File operation buttons with centered layout
         self.add_btn = self.create_button(file_btn_frame, "📁 Add Files", self.add_files, btn_color, fg_color)
         self.add_btn.grid(row=0, column=1, padx=(0, 10))
         
+        self.add_folder_btn = self.create_button(file_btn_frame, "🗂️ Add Folder", self.add_folder, btn_color, fg_color)
+        self.add_folder_btn.grid(row=0, column=2, padx=(0, 10))
+        
         self.remove_btn = self.create_button(file_btn_frame, "🗑️ Remove Selected", self.remove_files, '#d9534f', fg_color)
-        self.remove_btn.grid(row=0, column=2, padx=(0, 10))
+        self.remove_btn.grid(row=0, column=3, padx=(0, 10))
         
         self.clear_btn = self.create_button(file_btn_frame, "🧹 Clear All", self.clear_files, '#5bc0de', fg_color)
-        self.clear_btn.grid(row=0, column=3)
+        self.clear_btn.grid(row=0, column=4, padx=(0, 10))
+        
+        self.resume_btn = self.create_button(file_btn_frame, "↩️ Last Batch", self.resume_last_batch, btn_color, fg_color)
+        self.resume_btn.grid(row=0, column=5)
         
         # Convert Button - CENTERED
         convert_frame = tk.Frame(main_frame, bg=bg_color)
         convert_frame.grid(row=row, column=0, pady=(0, 15), sticky="ew")
         convert_frame.grid_columnconfigure(0, weight=1)
-        convert_frame.grid_columnconfigure(2, weight=1)
+        convert_frame.grid_columnconfigure(5, weight=1)
         row += 1
         
         self.convert_btn = tk.Button(convert_frame,
@@ -202,6 +3631,18 @@ class LibreOfficePDFConverter:
                                     font=('Arial', 13, 'bold'))
         self.convert_btn.grid(row=0, column=1, sticky="")
         
+        # Pause and Cancel act on the running batch
+        self.pause_btn = self.create_button(convert_frame, "⏸ Pause", self.toggle_pause, btn_color, fg_color)
+        self.pause_btn.grid(row=0, column=2, padx=(10, 0), sticky="ns")
+        self.pause_btn.config(state='disabled')
+        
+        self.cancel_btn = self.create_button(convert_frame, "✖ Cancel", self.cancel_conversion, '#d9534f', fg_color)
+        self.cancel_btn.grid(row=0, column=3, padx=(10, 0), sticky="ns")
+        self.cancel_btn.config(state='disabled')
+        
+        self.errors_btn = self.create_button(convert_frame, "⚠️ Errors", self.show_errors, '#f0ad4e', fg_color)
+        self.errors_btn.grid(row=0, column=4, padx=(10, 0), sticky="ns")
+        
         # Status label
         self.status_label = tk.Label(main_frame,
                                     text="Ready to convert files",
@@ -316,6 +3757,7 @@ class LibreOfficePDFConverter:
     
     def select_output_folder(self):
         """Select output folder using file dialog"""
+        from tkinter import filedialog
         folder = filedialog.askdirectory(
             title="Select Output Folder",
             initialdir=self.output_dir.get()
@@ -325,21 +3767,26 @@ class LibreOfficePDFConverter:
     
     def open_github(self):
         """Open GitHub profile in web browser"""
+        import webbrowser
         webbrowser.open("https://github.com/leolynn7")
     
     def check_libreoffice(self):
         """Check if LibreOffice is installed"""
-        try:
-            result = subprocess.run(['which', 'libreoffice'], 
-                                   capture_output=True, 
-                                   text=True)
-            if result.returncode != 0:
-                self.show_install_instructions()
-                return False
-            return True
-        except:
+        self.binary = find_soffice()
+        if self.binary is None:
             self.show_install_instructions()
             return False
+        return True
+    
+    def prewarm(self):
+        """Get the first worker and the cache key ready in the background"""
+        worker = self.pool.workers[0]
+        try:
+            libreoffice_version(worker.binary)
+            worker.prewarm()
+        except Exception:
+            # The first conversion will report any real problem
+            pass
     
     def show_install_instructions(self):
         """Show LibreOffice installation instructions"""
@@ -357,36 +3804,124 @@ class LibreOfficePDFConverter:
     def add_files(self):
         """Add files to convert"""
         filetypes = [
-            ("Office Files", "*.docx *.doc *.xlsx *.xls *.odt *.ods *.ppt *.pptx"),
+            ("Office Files", " ".join("*" + ext for ext in OFFICE_EXTENSIONS)),
             ("All Files", "*.*")
         ]
         
+        from tkinter import filedialog
         files = filedialog.askopenfilenames(filetypes=filetypes)
-        
-        for file in files:
-            if file not in self.files_to_convert:
-                self.files_to_convert.append(file)
-                display_name = os.path.basename(file)
-                # Truncate long filenames
-                if len(display_name) > 50:
-                    display_name = display_name[:47] + "..."
-                self.file_listbox.insert(tk.END, f"📄 {display_name}")
+        self.add_paths(files)
+    
+    def add_folder(self):
+        """Add every Office file below a folder, scanning in the background"""
+        from tkinter import filedialog
+        folder = filedialog.askdirectory(title="Select Folder to Convert")
+        if not folder:
+            return
+        self.discovering += 1
+        self.update_status(f"Scanning {folder}...")
+        thread = threading.Thread(target=self.discover_folder, args=(folder,), daemon=True)
+        thread.start()
+    
+    def discover_folder(self, folder):
+        """Walk a folder tree and feed documents to the Tk loop in batches"""
+        batch = []
+        for path in iter_documents(folder):
+            batch.append(path)
+            if len(batch) >= 200:
+                self.root.after(0, self.add_paths, batch)
+                batch = []
+        self.root.after(0, self.add_paths, batch)
+        self.root.after(0, self.discovery_finished)
+    
+    def discovery_finished(self):
+        """Close a running batch once no folder scans are left"""
+        self.discovering -= 1
+        if self.discovering == 0:
+            self.update_status(f"Found {len(self.files_to_convert)} files")
+            if self.scheduler is not None:
+                self.scheduler.close()
+    
+    def add_paths(self, paths):
+        """Queue new files, skipping ones already in the list"""
+        for file in paths:
+            if file in self.queued_paths:
+                continue
+            self.queued_paths.add(file)
+            self.files_to_convert.append(file)
+            self.file_states.append(QUEUED)
+            # Files found while a batch is running join it straight away
+            if self.scheduler is not None and not self.scheduler.jobs.closed:
+                self.scheduler.submit(file, tag=len(self.files_to_convert) - 1)
+        if self.discovering:
+            self.update_status(f"Scanning... {len(self.files_to_convert)} files found")
+        self.file_list.refresh()
+    
+    def resume_last_batch(self):
+        """Reload the last batch from its journal and convert what is left"""
+        if self.scheduler is not None or self.discovering:
+            messagebox.showwarning("Conversion Running", "Wait for the current conversion to finish.")
+            return
+        state = BatchJournal().resume()
+        if state is None or all(done for path, done in state[2]):
+            messagebox.showinfo("Nothing to Resume", "The last batch has no unfinished files.")
+            return
+        output_dir, optimize, files = state
+        self.output_dir.set(output_dir)
+        self.optimize.set(optimize or "Off")
+        self.last_settings = (os.path.abspath(output_dir), optimize or "Off")
+        self.files_to_convert = [path for path, done in files]
+        self.file_states = bytearray(DONE if done else QUEUED for path, done in files)
+        self.sizes = {}
+        self.queued_paths = set(self.files_to_convert)
+        self.file_list.clear_selection()
+        self.file_list.refresh()
+        self.convert_files()
+    
+    def row_text(self, index):
+        """Render one row of the file list"""
+        display_name = os.path.basename(self.files_to_convert[index])
+        # Truncate long filenames
+        if len(display_name) > 50:
+            display_name = display_name[:47] + "..."
+        if index in self.sizes:
+            before, after = self.sizes[index]
+            display_name += f"  ({format_size(before)} → {format_size(after)})"
+        return f"{STATE_ICONS[self.file_states[index]]} {display_name}"
     
     def remove_files(self):
         """Remove selected files"""
-        selection = self.file_listbox.curselection()
-        for index in reversed(selection):
-            self.files_to_convert.pop(index)
-            self.file_listbox.delete(index)
+        if self.scheduler is not None:
+            messagebox.showwarning("Conversion Running", "Files can't be removed during a conversion.")
+            return
+        selection = set(self.file_list.curselection())
+        if not selection:
+            return
+        # Rebuild the arrays once instead of popping row by row
+        keep = [i for i in range(len(self.files_to_convert)) if i not in selection]
+        for index in selection:
+            self.queued_paths.discard(self.files_to_convert[index])
+        self.files_to_convert = [self.files_to_convert[i] for i in keep]
+        self.file_states = bytearray(self.file_states[i] for i in keep)
+        self.sizes = {new: self.sizes[old] for new, old in enumerate(keep) if old in self.sizes}
+        self.file_list.clear_selection()
+        self.file_list.refresh()
     
     def clear_files(self):
         """Clear all files"""
+        if self.scheduler is not None:
+            messagebox.showwarning("Conversion Running", "Files can't be removed during a conversion.")
+            return
         self.files_to_convert.clear()
-        self.file_listbox.delete(0, tk.END)
+        self.file_states = bytearray()
+        self.sizes.clear()
+        self.queued_paths.clear()
+        self.file_list.clear_selection()
+        self.file_list.refresh()
     
     def convert_files(self):
         """Convert files using LibreOffice"""
-        if not self.files_to_convert:
+        if not self.files_to_convert and not self.discovering:
             messagebox.showwarning("No Files", "Please add files first.")
             return
         
@@ -404,90 +3939,300 @@ class LibreOfficePDFConverter:
             else:
                 return
         
+        # Read the worker count on the Tk thread
+        try:
+            jobs = max(1, int(self.jobs_var.get()))
+        except (tk.TclError, ValueError):
+            jobs = default_jobs()
+            self.jobs_var.set(jobs)
+        
+        # Workers stay alive between batches so later runs start warm
+        old_pool = None
+        if self.pool is not None and len(self.pool.workers) != jobs:
+            old_pool, self.pool = self.pool, None
+        if self.pool is None:
+            self.pool = WorkerPool(self.binary or 'libreoffice', size=jobs)
+        
+        if self.model is None:
+            self.model = ThroughputModel()
+        
+        # PDFs are appended to the merged file in list order as they finish. Its
+        # name is claimed first, so a document called merged.docx can't take it
+        names = OutputNames(output_dir)
+        merger = BatchMerger(names.reserve("merged.pdf")) if self.merge.get() else None
+        
+        # Each converted PDF is optimized while soffice renders the next ones
+        optimizer = None
+        if self.optimize.get() != "Off":
+            optimizer = PdfOptimizer(self.optimize.get())
+            if not optimizer.usable:
+                optimizer.close()
+                optimizer = None
+                messagebox.showwarning("Optimizer Not Found",
+                                       "PDF optimization needs Ghostscript or qpdf.\n\n"
+                                       "Ubuntu/Debian: sudo apt install ghostscript qpdf\n\n"
+                                       "Converting without optimizing.")
+        self.optimizer = optimizer
+        
+        # Queue everything listed so far; a running folder scan keeps adding.
+        # After a cancel only the files not yet converted are queued again,
+        # with the converted ones keeping their PDF names and merge position,
+        # unless the output folder or optimize preset has changed since.
+        # Every state change is journaled so "Last Batch" can pick up after a crash
+        settings = (os.path.abspath(output_dir), self.optimize.get())
+        resume = (settings == self.last_settings and DONE in self.file_states
+                  and not all(state == DONE for state in self.file_states))
+        self.last_settings = settings
+        if not resume:
+            self.sizes = {}
+        
+        # Errors from the previous batch make way for this one's
+        self.errors.clear()
+        
+        journal = BatchJournal()
+        try:
+            journal.begin(output_dir, optimizer.preset if optimizer is not None else None)
+        except OSError as e:
+            # The batch can still run, it just can't be resumed after a crash
+            self.errors.note(journal.path, f"Batch journal unavailable: {e}")
+            journal = None
+        scheduler = BatchScheduler(self.pool, output_dir,
+                                   on_update=lambda job: self.on_job_update(scheduler, job, merger),
+                                   model=self.model,
+                                   largest_first=self.largest_first.get(),
+                                   journal=journal,
+                                   optimizer=optimizer,
+                                   names=names)
+        for index, file in enumerate(self.files_to_convert):
+            if resume and self.file_states[index] == DONE:
+                job = scheduler.carry_over(file, tag=index)
+                if merger is not None:
+                    merger.add(job)
+            else:
+                self.file_states[index] = QUEUED
+                scheduler.submit(file, tag=index)
+        if not self.discovering:
+            scheduler.close()
+        self.scheduler = scheduler
+        self.refresh_errors()
+        
+        # Update UI to show conversion starting
+        self.convert_btn.config(state='disabled', bg='#666666')
+        self.pause_btn.config(state='normal', text="⏸ Pause")
+        self.cancel_btn.config(state='normal')
+        self.status_label.config(text=f"Starting conversion of {len(scheduler.submitted)} files...")
+        
         # Start conversion in thread
-        thread = threading.Thread(target=lambda: self.run_conversion(output_dir), daemon=True)
+        thread = threading.Thread(target=self.run_conversion,
+                                  args=(scheduler, output_dir, old_pool, merger, optimizer), daemon=True)
         thread.start()
     
-    def run_conversion(self, output_dir):
+    def run_conversion(self, scheduler, output_dir, old_pool=None, merger=None, optimizer=None):
         """Run the actual conversion"""
-        total = len(self.files_to_convert)
-        successful = 0
-        
-        # Update UI to show conversion starting
-        self.root.after(0, self.convert_btn.config, {'state': 'disabled', 'bg': '#666666'})
-        self.root.after(0, self.status_label.config, {'text': f"Starting conversion of {total} files..."})
-        
-        for i, file in enumerate(self.files_to_convert):
-            # Update status
-            filename = os.path.basename(file)
-            self.root.after(0, self.update_status, f"Converting {i+1}/{total}: {filename}")
+        try:
+            # Workers can't be shared with a pre-warm that is still starting one
+            if self.prewarm_thread is not None:
+                self.prewarm_thread.join()
+            if old_pool is not None:
+                old_pool.shutdown()
+            if self.cache is None:
+                try:
+                    self.cache = ConversionCache(version=libreoffice_version(self.pool.workers[0].binary))
+                except OSError as e:
+                    self.errors.note(user_cache_dir(), f"Cache unavailable, converting without it: {e}")
             
-            try:
-                # Use LibreOffice to convert
-                cmd = [
-                    'libreoffice',
-                    '--headless',
-                    '--convert-to', 'pdf',
-                    '--outdir', output_dir,
-                    file
-                ]
-                
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-                
-                if result.returncode == 0:
-                    successful += 1
-                    # Update listbox to show success
-                    self.root.after(0, self.mark_as_converted, i)
-                else:
-                    error_msg = result.stderr[:100] if result.stderr else "Unknown error"
-                    self.root.after(0, self.show_error, 
-                                  f"Failed to convert: {filename}\nError: {error_msg}")
+            scheduler.cache = self.cache
+            scheduler.start()
+            scheduler.wait()
+        except Exception as e:
+            self.errors.note(output_dir, f"Conversion stopped: {e}")
+            scheduler.cancel()
+        finally:
+            # Each step runs even if an earlier one failed, and the GUI always hears back
+            steps = [("Batch journal", scheduler.journal.close if scheduler.journal is not None else None),
+                     ("Cache", self.cache.save if self.cache is not None else None),
+                     ("Throughput model", self.model.save),
+                     ("Merged PDF", merger.close if merger is not None else None)]
+            for name, step in steps:
+                if step is None:
+                    continue
+                try:
+                    step()
+                except (OSError, PdfMergeError) as e:
+                    self.errors.note(output_dir, f"{name}: {e}")
             
-            except subprocess.TimeoutExpired:
-                self.root.after(0, self.show_error, f"Timeout: {filename} took too long")
-            except Exception as e:
-                self.root.after(0, self.show_error, f"Error converting {filename}: {str(e)[:50]}")
-        
-        # Complete
-        self.root.after(0, self.conversion_complete, successful, total, output_dir)
+            # Complete
+            self.root.after(0, self.conversion_complete, scheduler.succeeded, len(scheduler.submitted),
+                            output_dir, merger, scheduler.cancelled, optimizer)
     
-    def mark_as_converted(self, index):
-        """Mark a file as converted in the listbox"""
-        current_text = self.file_listbox.get(index)
-        if not current_text.startswith("✅ "):
-            # Replace the file icon with checkmark
-            new_text = "✅ " + current_text[2:]
-            self.file_listbox.delete(index)
-            self.file_listbox.insert(index, new_text)
+    def on_job_update(self, scheduler, job, merger=None):
+        """Forward a worker's progress to the Tk loop"""
+        filename = os.path.basename(job.path)
+        finished = scheduler.succeeded + scheduler.failed
+        total = len(scheduler.submitted)
+        if job.state == 'running':
+            self.file_states[job.tag] = RUNNING
+            self.pending_status = f"Converting {finished + 1}/{total}: {filename}"
+            eta = scheduler.eta()
+            if eta is not None:
+                self.pending_status += f" • ETA {format_duration(eta)}"
+        elif job.state in ('queued', 'cancelled'):
+            # Requeued for another attempt, or left for the next batch
+            self.file_states[job.tag] = QUEUED
+        elif job.state == 'done':
+            self.file_states[job.tag] = DONE
+            if job.optimized_size is not None:
+                self.sizes[job.tag] = (job.output_size, job.optimized_size)
+        else:
+            self.file_states[job.tag] = FAILED
+            self.errors.add(job)
+        if merger is not None:
+            merger.add(job)
+        self.request_refresh()
+    
+    def request_refresh(self):
+        """Coalesce worker updates into at most one redraw per frame"""
+        with self.refresh_lock:
+            if self.refresh_pending:
+                return
+            self.refresh_pending = True
+        self.root.after(16, self.flush_updates)
+    
+    def flush_updates(self):
+        """Apply all state changes since the last frame in one redraw"""
+        with self.refresh_lock:
+            self.refresh_pending = False
+        if self.pending_status is not None:
+            self.update_status(self.pending_status)
+            self.pending_status = None
+        self.file_list.refresh()
+        self.refresh_errors()
+    
+    def refresh_errors(self):
+        """Update the error count and an open error panel"""
+        if len(self.errors) == self.shown_errors:
+            return
+        self.shown_errors = len(self.errors)
+        self.errors_btn.config(text=f"⚠️ Errors ({self.shown_errors})" if self.shown_errors else "⚠️ Errors")
+        if self.error_panel is not None and self.error_panel.is_open:
+            self.error_panel.refresh()
+    
+    def show_errors(self):
+        """Open the error panel, or bring it to the front"""
+        if self.error_panel is not None and self.error_panel.is_open:
+            self.error_panel.lift()
+            return
+        bg_color, fg_color, btn_color = self.colors
+        self.error_panel = ErrorPanel(self.root, self.errors, self.create_button, bg_color, fg_color, btn_color)
     
     def update_status(self, message):
         """Update status label"""
         self.status_label.config(text=message)
     
-    def show_error(self, message):
-        """Show error message"""
-        messagebox.showerror("Error", message)
+    def toggle_pause(self):
+        """Hold or continue the running batch"""
+        scheduler = self.scheduler
+        if scheduler is None:
+            return
+        if scheduler.paused:
+            scheduler.resume()
+            self.pause_btn.config(text="⏸ Pause")
+            self.update_status("Resuming conversion...")
+        else:
+            scheduler.pause()
+            self.pause_btn.config(text="▶ Resume")
+            self.update_status("Paused - files already converting will finish")
+    
+    def cancel_conversion(self):
+        """Stop the running batch, keeping the PDFs converted so far"""
+        scheduler = self.scheduler
+        if scheduler is None:
+            return
+        self.pause_btn.config(state='disabled')
+        self.cancel_btn.config(state='disabled')
+        self.update_status("Cancelling...")
+        # Waiting for soffice to exit would block the Tk loop
+        threading.Thread(target=scheduler.cancel, daemon=True).start()
+    
+    def on_close(self):
+        """Stop LibreOffice workers before closing the window"""
+        if self.closing is not None:
+            return
+        self.update_status("Closing...")
+        # Waiting for soffice to exit would block the Tk loop
+        self.closing = threading.Thread(target=self.shut_down, daemon=True)
+        self.closing.start()
+        self.finish_close()
+    
+    def shut_down(self):
+        """Cancel the batch and stop the workers, off the Tk thread"""
+        scheduler, optimizer, pool = self.scheduler, self.optimizer, self.pool
+        if scheduler is not None:
+            scheduler.cancel()
+            if scheduler.journal is not None:
+                scheduler.journal.flush()
+        if optimizer is not None:
+            optimizer.close(cancel=True)
+        if pool is not None:
+            pool.shutdown()
+    
+    def finish_close(self):
+        """Destroy the window once shut_down() is done"""
+        if self.closing.is_alive():
+            self.root.after(100, self.finish_close)
+        else:
+            self.root.destroy()
     
-    def conversion_complete(self, successful, total, output_dir):
+    def conversion_complete(self, successful, total, output_dir, merger=None, cancelled=0, optimizer=None):
         """Handle completion"""
+        self.scheduler = None
+        self.optimizer = None
+        if self.closing is not None:
+            return
+        
         # Re-enable convert button
         self.root.after(0, self.convert_btn.config, {'state': 'normal', 'bg': '#5cb85c'})
+        self.pause_btn.config(state='disabled', text="⏸ Pause")
+        self.cancel_btn.config(state='disabled')
         
-        if successful == total:
+        if cancelled:
+            message = f"✖ Cancelled after converting {successful} of {total} files"
+            details = (f"Converted {successful}/{total} files before cancelling.\n\nSaved to:\n{output_dir}"
+                       f"\n\nClick Convert to continue with the remaining {cancelled} files.")
+        elif successful == total:
             message = f"✅ Successfully converted {successful} files!"
             details = f"All {successful} files converted successfully!\n\nSaved to:\n{output_dir}"
         elif successful > 0:
             message = f"⚠️ Converted {successful} out of {total} files"
-            details = f"Converted {successful}/{total} files\n\nSaved to:\n{output_dir}\n\nCheck error messages for failed files."
+            details = f"Converted {successful}/{total} files\n\nSaved to:\n{output_dir}"
         else:
             message = "❌ Conversion failed!"
-            details = f"Failed to convert all {total} files.\n\nCheck error messages above."
+            details = f"Failed to convert all {total} files."
+        
+        if optimizer is not None and optimizer.optimized:
+            details += f"\n\nOptimized {optimizer.summary()}"
+        
+        if merger is not None and merger.merged:
+            details += f"\n\nMerged {merger.merged} files into:\n{merger.merger.path}"
+            if merger.errors:
+                details += f"\n({len(merger.errors)} PDFs could not be merged)"
         
         self.status_label.config(text=message)
-        messagebox.showinfo("Conversion Complete", details)
+        self.refresh_errors()
+        if self.errors and not (self.error_panel is not None and self.error_panel.is_open):
+            if messagebox.askyesno("Conversion Complete",
+                                   f"{details}\n\n{len(self.errors)} errors were reported. Show them?"):
+                self.show_errors()
+        else:
+            messagebox.showinfo("Conversion Complete", details)
+
+def run_gui():
+    """Start the tkinter interface"""
+    global tk, messagebox
+    import tkinter as tk
+    import tkinter.font
+    from tkinter import messagebox
 
-# Run the application
-if __name__ == "__main__":
     root = tk.Tk()
     
     # Set window icon if available
@@ -497,6 +4242,7 @@ if __name__ == "__main__":
         pass
     
     app = LibreOfficePDFConverter(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
     
     # Center window
     root.update_idletasks()
@@ -514,4 +4260,75 @@ if __name__ == "__main__":
     root.grid_rowconfigure(0, weight=1)
     root.grid_columnconfigure(0, weight=1)
     
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+
+
+def main(argv=None):
+    """Parse the command line and run the GUI or the headless CLI"""
+    parser = argparse.ArgumentParser(description="Convert Office files to PDF using LibreOffice")
+    parser.add_argument('--cli', action='store_true',
+                        help="convert without the GUI, printing one JSON line per file")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and convert new or modified files in the input folders")
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help="seconds a watched file must stay unchanged before converting (default: 2)")
+    parser.add_argument('--serve', action='store_true',
+                        help="run a local HTTP conversion service")
+    parser.add_argument('--host', default='127.0.0.1', help="--serve address (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8765, help="--serve port (default: 8765)")
+    parser.add_argument('--max-queue', type=int, default=64,
+                        help="documents --serve queues before answering 429 (default: 64)")
+    parser.add_argument('--max-upload', type=int, default=200,
+                        help="largest --serve upload in MB (default: 200)")
+    parser.add_argument('--allow-paths', action='store_true',
+                        help="let --serve clients convert local files by path")
+    parser.add_argument('inputs', nargs='*',
+                        help="files, directories or glob patterns to convert")
+    parser.add_argument('-o', '--outdir', default=os.getcwd(),
+                        help="output folder (default: current directory)")
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                        help="parallel conversions (default: CPU count)")
+    parser.add_argument('--soffice', help="path to the LibreOffice executable")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always reconvert instead of reusing cached PDFs")
+    parser.add_argument('--cache-dir', help="PDF cache folder (default: ~/.cache/pdf-converter/pdfs)")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_BYTES // 1024 ** 2,
+                        help="PDF cache limit in MB (default: %(default)s)")
+    parser.add_argument('--order', choices=('largest', 'fifo'), default='largest',
+                        help="convert the longest-estimated files first (default) or in input order")
+    parser.add_argument('--timeout', type=float,
+                        help="fixed per-file time limit in seconds (default: learned from file size and type)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, metavar='N',
+                        help=f"documents per soffice run when LibreOffice's Python bridge is missing "
+                             f"(default: {BATCH_SIZE}; 1 runs soffice once per file)")
+    parser.add_argument('--merge', metavar='FILE',
+                        help="also combine the PDFs, in input order, into FILE with a bookmark per document")
+    parser.add_argument('--optimize', choices=sorted(OPTIMIZE_PRESETS),
+                        help="shrink each PDF with Ghostscript/qpdf while later files convert "
+                             "(needs gs and/or qpdf)")
+    parser.add_argument('--run-log', help="write per-file timings as JSON lines to this file")
+    parser.add_argument('--metrics', help="write Prometheus text-format metrics to this file")
+    parser.add_argument('--trace', help="write a Chrome trace of worker activity to this file")
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+
+    if args.serve:
+        return run_serve(args)
+    if args.watch:
+        if not args.inputs or not all(os.path.isdir(folder) for folder in args.inputs):
+            parser.error("--watch needs one or more folders")
+        return run_watch(args)
+    if args.cli:
+        if not args.inputs:
+            parser.error("--cli needs at least one input")
+        return run_cli(args)
+    run_gui()
+    return 0
+
+
+# Run the application
+if __name__ == "__main__":
+    sys.exit(main())
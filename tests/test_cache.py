@@ -0,0 +1,45 @@
+import itertools
+
+import pdf_converter
+from pdf_converter import ConversionCache
+
+
+def pdf(tmp_path, name, size=100):
+    path = tmp_path / f'{name}.pdf'
+    path.write_bytes(b'x' * size)
+    return str(path)
+
+
+def test_save_merges_processes_and_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(pdf_converter.time, 'time', lambda: next(clock))
+    directory = str(tmp_path / 'cache')
+    # Two processes sharing the folder, each under the cap on its own
+    first = ConversionCache(directory, max_bytes=250)
+    second = ConversionCache(directory, max_bytes=250)
+    first.store('aa01', pdf(tmp_path, 'a'))
+    second.store('bb02', pdf(tmp_path, 'b'))
+    assert first.lookup('aa01') is not None
+    second.store('cc03', pdf(tmp_path, 'c'))
+    first.save()
+    second.save()
+
+    # Together they are over it, and bb02 was used least recently
+    assert not (tmp_path / 'cache' / 'bb' / 'bb02.pdf').exists()
+    assert list(second.entries) == ['aa01', 'cc03']
+    assert list(ConversionCache(directory, max_bytes=250).entries) == ['aa01', 'cc03']
+
+
+def test_load_counts_pdfs_missing_from_the_index(tmp_path):
+    directory = str(tmp_path / 'cache')
+    saved = ConversionCache(directory)
+    saved.store('aa01', pdf(tmp_path, 'a'))
+    saved.save()
+    # A process that crashed before saving its index
+    ConversionCache(directory).store('bb02', pdf(tmp_path, 'b'))
+
+    assert set(ConversionCache(directory).entries) == {'aa01', 'bb02'}
+    # and its PDF counts towards the cap
+    cache = ConversionCache(directory, max_bytes=150)
+    assert cache.size == 100
+    assert len(list((tmp_path / 'cache').glob('??/*.pdf'))) == 1
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+from pdf_converter import BatchScheduler, ConversionCrash, ConversionError
+
+
+class ChunkWorker:
+    """Stands in for a cold SofficeWorker, converting documents in order
+
+    Names containing 'bad' fail to load and are skipped, as soffice does;
+    'crash' kills the run, leaving every later document unconverted.
+    """
+
+    timeout = 60
+
+    def __init__(self):
+        self.converted = 0
+        self.runs = []
+
+    def convert_batch(self, jobs, timeout=None):
+        self.runs.append([name(job) for job in jobs])
+        for job in jobs:
+            job.spawned_at = job.rendered_at = 0
+            if 'crash' in job.path:
+                return ConversionCrash("soffice crashed", returncode=134)
+            if 'bad' not in job.path:
+                job.output = job.target
+                self.converted += 1
+        if any(job.output is None for job in jobs):
+            return ConversionError("source file could not be loaded", returncode=0)
+        return None
+
+
+def name(job):
+    return job.path.rsplit('/', 1)[1]
+
+
+def run_chunk(tmp_path, *names):
+    scheduler = BatchScheduler(SimpleNamespace(workers=[]), str(tmp_path))
+    jobs = [scheduler.submit(f'/in/{name}') for name in names]
+    worker = ChunkWorker()
+    scheduler.convert_chunk(worker, jobs)
+    return worker.runs, jobs
+
+
+def test_crash_is_bisected_down_to_the_culprit(tmp_path):
+    runs, jobs = run_chunk(tmp_path, 'a.docx', 'b.docx', 'crash.docx', 'c.docx', 'd.docx', 'e.docx')
+    assert runs == [['a.docx', 'b.docx', 'crash.docx', 'c.docx', 'd.docx', 'e.docx'],
+                    ['crash.docx', 'c.docx'],
+                    ['crash.docx'],
+                    ['c.docx'],
+                    ['d.docx', 'e.docx']]
+    assert [name(job) for job in jobs if job.output is None] == ['crash.docx']
+    assert isinstance(jobs[2].error, ConversionCrash)
+    assert all(job.error is None for job in jobs if job.output is not None)
+
+
+def test_unloadable_document_is_not_bisected(tmp_path):
+    # soffice carries on past a document it can't load, so one run is enough
+    runs, jobs = run_chunk(tmp_path, 'a.docx', 'bad.docx', 'b.docx', 'bad2.docx')
+    assert runs == [['a.docx', 'bad.docx', 'b.docx', 'bad2.docx']]
+    assert [name(job) for job in jobs if job.error is not None] == ['bad.docx', 'bad2.docx']
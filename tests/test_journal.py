@@ -0,0 +1,65 @@
+import json
+
+from pdf_converter import BatchJournal, Job
+
+
+def finish(job, output):
+    """Mark a job converted, as BatchScheduler does"""
+    output.write_bytes(b'%PDF-1.4\n%%EOF\n')
+    job.state = 'done'
+    job.output = str(output)
+    job.output_size = output.stat().st_size
+    return job
+
+
+def test_resume_replays_the_last_state_of_each_file(tmp_path):
+    sources = []
+    for name in ('a', 'b', 'c', 'd', 'e'):
+        path = tmp_path / f'{name}.docx'
+        path.write_text(name)
+        sources.append(path)
+    out = tmp_path / 'out'
+    out.mkdir()
+
+    journal = BatchJournal(str(tmp_path / 'journal.jsonl'))
+    journal.begin(str(out), 'ebook')
+    jobs = [Job(index, str(path)) for index, path in enumerate(sources)]
+    for job in jobs:
+        journal.record(job)
+    a, b, c, d, e = jobs
+    for job in (a, c, d, e):
+        journal.record(finish(job, out / f'{job.index}.pdf'))
+    journal.converted(str(sources[1]), str(out / 'b.pdf'))
+    journal.close()
+
+    # c's source changed and d's PDF is gone since they were converted
+    sources[2].write_text('changed')
+    (out / '3.pdf').unlink()
+    # e's 'done' line was cut short by a crash
+    lines = (tmp_path / 'journal.jsonl').read_text().splitlines(keepends=True)
+    assert json.loads(lines[-2])['path'] == str(sources[4])
+    (tmp_path / 'journal.jsonl').write_text(''.join(lines[:-2]) + lines[-2][:20] + lines[-1])
+
+    output_dir, optimize, files = BatchJournal(str(tmp_path / 'journal.jsonl')).resume()
+    assert output_dir == str(out)
+    assert optimize == 'ebook'
+    # b was carried over without a PDF on disk, e only reached 'queued'
+    assert files == [(str(sources[0]), True), (str(sources[1]), False), (str(sources[2]), False),
+                     (str(sources[3]), False), (str(sources[4]), False)]
+
+
+def test_resume_without_a_journal(tmp_path):
+    assert BatchJournal(str(tmp_path / 'missing.jsonl')).resume() is None
+
+
+def test_begin_replaces_the_previous_batch(tmp_path):
+    path = tmp_path / 'doc.docx'
+    path.write_text('x')
+    journal = BatchJournal(str(tmp_path / 'journal.jsonl'))
+    journal.begin(str(tmp_path / 'first'))
+    journal.record(Job(0, str(path)))
+    journal.close()
+    journal.begin(str(tmp_path / 'second'))
+    journal.close()
+
+    assert BatchJournal(str(tmp_path / 'journal.jsonl')).resume() == (str(tmp_path / 'second'), None, [])
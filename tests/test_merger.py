@@ -0,0 +1,133 @@
+import re
+
+import pytest
+
+from pdf_converter import PdfMergeError, PdfMerger
+
+
+def write_pdf(path, objects, root=1, update=None):
+    """Write a PDF with a classic xref table from {number: body bytes}
+
+    ``update`` objects are appended as an incremental update whose
+    trailer points back to the first table with /Prev.
+    """
+    data = bytearray(b'%PDF-1.4\n')
+
+    def section(objects, prev=None):
+        offsets = {}
+        for number, body in sorted(objects.items()):
+            offsets[number] = len(data)
+            data.extend(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+        xref = len(data)
+        data.extend(b'xref\n')
+        for number, offset in sorted(offsets.items()):
+            data.extend(b'%d 1\n%010d 00000 n\r\n' % (number, offset))
+        size = max(objects) + 1
+        data.extend(b'trailer\n<</Size %d/Root %d 0 R' % (size, root))
+        if prev is not None:
+            data.extend(b'/Prev %d' % prev)
+        data.extend(b'>>\nstartxref\n%d\n%%%%EOF\n' % xref)
+        return xref
+
+    first = section(objects)
+    if update:
+        section(update, prev=first)
+    path.write_bytes(bytes(data))
+    return str(path)
+
+
+def page_objects(content, length=None, extra=b''):
+    """Catalog, page tree, one page and its content stream"""
+    length = b'%d' % len(content) if length is None else length
+    return {
+        1: b'<</Type/Catalog/Pages 2 0 R>>',
+        2: b'<</Type/Pages/Kids[3 0 R]/Count 1>>',
+        3: b'<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]/Contents 4 0 R' + extra + b'>>',
+        4: b'<</Length ' + length + b'>>\nstream\n' + content + b'\nendstream',
+    }
+
+
+def read_back(path):
+    """Parse a merged PDF with its own cross-reference table"""
+    data = open(path, 'rb').read()
+    xref, trailer = PdfMerger.read_xref(data, path)
+    # Reading needs none of the output state __init__ sets up
+    reader = object.__new__(PdfMerger)
+    objects = {number: reader.read_object(data, xref, number, path)
+               for number, offset in xref.items() if offset is not None}
+    return objects, trailer
+
+
+def merge(tmp_path, *sources):
+    output = str(tmp_path / 'merged.pdf')
+    merger = PdfMerger(output)
+    for source, title in sources:
+        merger.append(source, title)
+    merger.close()
+    return output
+
+
+def test_indirect_length(tmp_path):
+    # The stream data contains "endstream", so only the /Length can tell where it ends
+    content = b'BT (a) Tj ET\nendstream in the data'
+    objects = page_objects(content, length=b'5 0 R')
+    objects[5] = b'%d' % len(content)
+    source = write_pdf(tmp_path / 'a.pdf', objects)
+
+    objects, trailer = read_back(merge(tmp_path, (source, 'a')))
+    streams = [stream for body, stream in objects.values() if stream is not None]
+    assert streams == [content]
+
+
+def test_string_containing_endobj(tmp_path):
+    # Keywords and references inside literal strings must be left alone
+    note = b'(ends with endobj and 7 0 R\\) inside)'
+    source = write_pdf(tmp_path / 'a.pdf', page_objects(b'BT ET', extra=b'/Note ' + note))
+
+    objects, trailer = read_back(merge(tmp_path, (source, 'a')))
+    pages = [body for body, stream in objects.values() if b'/Type/Page/' in body]
+    assert len(pages) == 1
+    assert note in pages[0]
+
+
+def test_incremental_update_uses_newest_objects(tmp_path):
+    update = {4: b'<</Length 3>>\nstream\nnew\nendstream'}
+    source = write_pdf(tmp_path / 'a.pdf', page_objects(b'old'), update=update)
+
+    objects, trailer = read_back(merge(tmp_path, (source, 'a')))
+    streams = [stream for body, stream in objects.values() if stream is not None]
+    assert streams == [b'new']
+
+
+def test_merged_output_reads_back(tmp_path):
+    first = write_pdf(tmp_path / 'first.pdf', page_objects(b'BT (one) Tj ET'))
+    second = write_pdf(tmp_path / 'second.pdf', page_objects(b'BT (two) Tj ET'))
+
+    objects, trailer = read_back(merge(tmp_path, (first, 'First'), (second, 'Second (2)')))
+    catalog, _ = objects[PdfMerger.find_ref(trailer, b'Root', 'merged')]
+    pages, _ = objects[PdfMerger.find_ref(catalog, b'Pages', 'merged')]
+    assert re.search(rb'/Count\s*2\b', pages)
+    kids = re.findall(rb'(\d+) 0 R', re.search(rb'/Kids\s*\[([^\]]*)\]', pages).group(1))
+    assert len(kids) == 2
+    streams = [stream for body, stream in objects.values() if stream is not None]
+    assert streams == [b'BT (one) Tj ET', b'BT (two) Tj ET']
+    titles = [re.search(rb'/Title\s*(.*)/Parent', body).group(1)
+              for body, stream in objects.values() if b'/Title' in body]
+    assert titles == [b'(First)', b'(Second \\(2\\))']
+
+    # A second reader agrees, when one is installed
+    pypdf = pytest.importorskip('pypdf')
+    reader = pypdf.PdfReader(str(tmp_path / 'merged.pdf'))
+    assert len(reader.pages) == 2
+    assert [item.title for item in reader.outline] == ['First', 'Second (2)']
+
+
+def test_cross_reference_stream_is_rejected(tmp_path):
+    path = tmp_path / 'a.pdf'
+    path.write_bytes(b'%PDF-1.5\n1 0 obj\n<</Type/XRef>>\nstream\n\nendstream\nendobj\n'
+                     b'startxref\n9\n%%EOF\n')
+    merger = PdfMerger(str(tmp_path / 'merged.pdf'))
+    with pytest.raises(PdfMergeError):
+        merger.append(str(path), 'a')
+    merger.abort()
+    assert not (tmp_path / 'merged.pdf.part').exists()
@@ -0,0 +1,37 @@
+from pdf_converter import OutputNames
+
+
+def test_reserved_name_is_kept_from_documents(tmp_path):
+    names = OutputNames(str(tmp_path))
+    assert names.reserve('merged.pdf') == str(tmp_path / 'merged.pdf')
+    assert names.target('/in/merged.docx') == str(tmp_path / 'merged (docx).pdf')
+
+
+def test_reserve_numbers_a_name_a_document_holds(tmp_path):
+    names = OutputNames(str(tmp_path))
+    names.target('/in/merged.docx')
+    assert names.reserve('merged.pdf') == str(tmp_path / 'merged (2).pdf')
+
+
+def test_same_names_get_their_extension_then_a_counter(tmp_path):
+    names = OutputNames(str(tmp_path))
+    targets = [names.target(path) for path in
+               ('/in/a.docx', '/in/a.xlsx', '/in/sub/a.docx', '/in/A.docx', '/in/a.docx')]
+    # Compared case-insensitively, and a source queued again keeps its name
+    assert [target.rsplit('/', 1)[1] for target in targets] == [
+        'a.pdf', 'a (xlsx).pdf', 'a (docx).pdf', 'A (docx 2).pdf', 'a.pdf']
+
+
+def test_claims_survive_a_restart_while_their_pdf_exists(tmp_path):
+    state = str(tmp_path / 'state' / 'names.json')
+    names = OutputNames(str(tmp_path), state)
+    for path in ('/in/a.docx', '/in/sub/a.docx', '/in/sub/a.odt'):
+        open(names.target(path), 'w').close()
+    names.save()
+    (tmp_path / 'a (docx).pdf').unlink()
+
+    names = OutputNames(str(tmp_path), state)
+    # The deleted PDF's name is free again; the others still belong to their sources
+    assert names.target('/in/other/a.docx') == str(tmp_path / 'a (docx).pdf')
+    assert names.target('/in/sub/a.odt') == str(tmp_path / 'a (odt).pdf')
+    assert names.target('/in/new/a.odt') == str(tmp_path / 'a (odt 2).pdf')
@@ -0,0 +1,93 @@
+import errno
+import os
+
+import pytest
+
+import pdf_converter
+from pdf_converter import copy_fd, publish_file
+
+DATA = bytes(range(256)) * 4096
+
+
+def copy(tmp_path):
+    source, dest = tmp_path / 'source.pdf', tmp_path / 'dest.pdf'
+    source.write_bytes(DATA)
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        copy_fd(src.fileno(), dst.fileno())
+    return dest.read_bytes()
+
+
+def test_copy_fd(tmp_path):
+    assert copy(tmp_path) == DATA
+
+
+def test_copy_fd_continues_where_a_method_stopped(tmp_path, monkeypatch):
+    copy_file_range = os.copy_file_range
+    calls = []
+
+    def stop_early(src, dst, count):
+        # Copies one piece, then returns 0 as if it hit the end
+        calls.append(count)
+        return copy_file_range(src, dst, 1000) if len(calls) == 1 else 0
+
+    monkeypatch.setattr(os, 'copy_file_range', stop_early, raising=False)
+    # sendfile picks up from the offsets copy_file_range left
+    assert copy(tmp_path) == DATA
+    assert len(calls) == 2
+
+
+def test_copy_fd_rejects_a_short_copy(tmp_path, monkeypatch):
+    def unsupported(*args):
+        raise OSError(errno.EXDEV, 'copy')
+
+    monkeypatch.setattr(os, 'copy_file_range', unsupported, raising=False)
+    monkeypatch.setattr(os, 'sendfile', unsupported, raising=False)
+    monkeypatch.setattr(pdf_converter.shutil, 'copyfileobj', lambda fsrc, fdst: fdst.write(b'%PDF'))
+    with pytest.raises(OSError, match='Copied 4 of'):
+        copy(tmp_path)
+
+
+def cross_device(monkeypatch, source):
+    """Make renaming ``source`` fail as it would between filesystems"""
+    replace = os.replace
+
+    def fake(src, dst):
+        if src == source:
+            raise OSError(errno.EXDEV, 'Invalid cross-device link')
+        return replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', fake)
+
+
+def test_publish_moves_across_filesystems(tmp_path, monkeypatch):
+    source = tmp_path / 'scratch.pdf'
+    source.write_bytes(DATA)
+    (tmp_path / 'out').mkdir()
+    dest = tmp_path / 'out' / 'doc.pdf'
+    dest.write_bytes(b'old')
+    cross_device(monkeypatch, str(source))
+
+    assert publish_file(str(source), str(dest)) == str(dest)
+    assert dest.read_bytes() == DATA
+    assert not source.exists()
+    assert os.listdir(tmp_path / 'out') == ['doc.pdf']
+
+
+def test_failed_publish_leaves_the_old_file(tmp_path, monkeypatch):
+    source = tmp_path / 'scratch.pdf'
+    source.write_bytes(DATA)
+    (tmp_path / 'out').mkdir()
+    dest = tmp_path / 'out' / 'doc.pdf'
+    dest.write_bytes(b'old')
+    cross_device(monkeypatch, str(source))
+
+    def disk_full(src, dst):
+        os.write(dst, b'%PDF')
+        raise OSError(errno.ENOSPC, 'No space left on device')
+
+    monkeypatch.setattr(pdf_converter, 'copy_fd', disk_full)
+    with pytest.raises(OSError):
+        publish_file(str(source), str(dest))
+    assert dest.read_bytes() == b'old'
+    assert source.exists()
+    assert os.listdir(tmp_path / 'out') == ['doc.pdf']
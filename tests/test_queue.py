@@ -0,0 +1,78 @@
+from pdf_converter import Job, JobQueue
+
+
+def make_jobs(*names, estimates=None):
+    jobs = [Job(index, f'/in/{name}') for index, name in enumerate(names)]
+    for job, estimate in zip(jobs, estimates or ()):
+        job.estimate = estimate
+    return jobs
+
+
+def drain(queue, limit=1, workers=1):
+    """Take every batch get() hands out, as lists of file names"""
+    queue.close()
+    batches = []
+    while True:
+        batch = queue.get(limit, workers)
+        if batch is None:
+            return batches
+        batches.append([job.path.rsplit('/', 1)[1] for job in batch])
+        for job in batch:
+            queue.task_done()
+
+
+def test_submission_order():
+    queue = JobQueue()
+    for job in make_jobs('a.docx', 'b.docx', 'c.docx', estimates=[1, 9, 5]):
+        queue.put(job)
+    assert drain(queue) == [['a.docx'], ['b.docx'], ['c.docx']]
+
+
+def test_largest_first():
+    queue = JobQueue(largest_first=True)
+    for job in make_jobs('a.docx', 'b.docx', 'c.docx', 'd.docx', estimates=[1, 9, 5, 5]):
+        queue.put(job)
+    # Equal estimates keep submission order
+    assert drain(queue) == [['b.docx'], ['c.docx'], ['d.docx'], ['a.docx']]
+
+
+def test_retries_queue_behind_fresh_jobs():
+    queue = JobQueue(largest_first=True)
+    retried, fresh = make_jobs('big.docx', 'small.docx', estimates=[9, 1])
+    queue.put(retried, retry=True)
+    queue.put(fresh)
+    assert drain(queue) == [['small.docx'], ['big.docx']]
+
+
+def test_chunks_share_an_extension_and_have_distinct_names():
+    queue = JobQueue()
+    for job in make_jobs('a.docx', 'b.xlsx', 'c.docx', 'sub/a.docx', 'd.docx', 'e.docx'):
+        queue.put(job)
+    assert drain(queue, limit=3) == [['a.docx', 'c.docx', 'd.docx'],
+                                     ['b.xlsx'],
+                                     ['a.docx', 'e.docx']]
+
+
+def test_chunks_leave_work_for_other_workers():
+    queue = JobQueue()
+    for job in make_jobs(*(f'{n}.docx' for n in range(6))):
+        queue.put(job)
+    # A chunk takes at most a third of what is still queued when it is taken
+    assert [len(batch) for batch in drain(queue, limit=4, workers=3)] == [2, 2, 1, 1]
+
+
+def test_retries_run_alone():
+    queue = JobQueue()
+    retried, *fresh = make_jobs('a.docx', 'b.docx', 'c.docx')
+    for job in fresh:
+        queue.put(job)
+    queue.put(retried, retry=True)
+    assert drain(queue, limit=4) == [['b.docx', 'c.docx'], ['a.docx']]
+
+
+def test_cancel_returns_waiting_jobs_in_order():
+    queue = JobQueue(largest_first=True)
+    for job in make_jobs('a.docx', 'b.docx', estimates=[1, 2]):
+        queue.put(job)
+    assert [job.path for job in queue.cancel()] == ['/in/b.docx', '/in/a.docx']
+    assert queue.get() is None